@@ -0,0 +1,124 @@
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+from .cache import ingredients_cache
+
+MIN_TYPO_QUERY_LENGTH = 4
+MAX_INDEXED_PREFIX_LENGTH = 30
+
+
+def normalize(value):
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+class AutocompleteIndex:
+    """Отсортированный индекс названий для поиска по мере ввода.
+
+    Результаты ранжируются так: сначала названия, начинающиеся с запроса,
+    затем содержащие его, затем начинающиеся с запроса с одной опечаткой
+    (пропущенная, лишняя, заменённая или переставленная буква).
+    """
+
+    def __init__(self, items):
+        entries = sorted(
+            (normalize(item['name']), position)
+            for position, item in enumerate(items)
+        )
+        self.items = items
+        self.names = [name for name, _ in entries]
+        self.positions = [position for _, position in entries]
+        self.text = '\n'.join(self.names)
+        self.offsets = []
+        offset = 0
+        for name in self.names:
+            self.offsets.append(offset)
+            offset += len(name) + 1
+        self.alphabet = sorted({
+            char for name in self.names for char in name if char.isalpha()
+        })
+        self.prefixes = {
+            name[:length] for name in self.names
+            for length in range(
+                1, min(len(name), MAX_INDEXED_PREFIX_LENGTH) + 1
+            )
+        }
+
+    def search(self, query, limit):
+        query = normalize(query)
+        if not query:
+            return self.items[:limit]
+        found = {}
+        self._collect_prefix(query, found, limit)
+        if len(found) < limit:
+            self._collect_contains(query, found, limit)
+        if len(found) < limit and len(query) >= MIN_TYPO_QUERY_LENGTH:
+            for variant in sorted(self._typo_variants(query)):
+                self._collect_prefix(variant, found, limit)
+                if len(found) >= limit:
+                    break
+        return [self.items[position] for position in found]
+
+    def _collect_prefix(self, prefix, found, limit):
+        index = bisect_left(self.names, prefix)
+        while (len(found) < limit and index < len(self.names)
+               and self.names[index].startswith(prefix)):
+            found.setdefault(self.positions[index], None)
+            index += 1
+
+    def _collect_contains(self, query, found, limit):
+        start = self.text.find(query)
+        while start != -1 and len(found) < limit:
+            index = bisect_right(self.offsets, start) - 1
+            found.setdefault(self.positions[index], None)
+            start = self.text.find(
+                query, self.offsets[index] + len(self.names[index]) + 1
+            )
+
+    def _typo_variants(self, query):
+        query = query[:MAX_INDEXED_PREFIX_LENGTH - 1]
+        splits = [(query[:i], query[i:]) for i in range(len(query) + 1)]
+        variants = set()
+        for left, right in splits:
+            if left and left not in self.prefixes:
+                break
+            if right:
+                variants.add(left + right[1:])
+            if len(right) > 1:
+                variants.add(left + right[1] + right[0] + right[2:])
+            # Вариант с буквой, после которой нет ни одного названия,
+            # не ищется: так их число зависит от словаря, а не от
+            # размера алфавита.
+            for char in self.alphabet:
+                if left + char not in self.prefixes:
+                    continue
+                if right:
+                    variants.add(left + char + right[1:])
+                variants.add(left + char + right)
+        variants.discard(query)
+        return variants & self.prefixes
+
+
+class IngredientAutocomplete:
+    """Индекс ингредиентов, который пересобирается при смене версии кэша."""
+
+    def __init__(self, reference_cache):
+        self.reference_cache = reference_cache
+        self._index = (None, None)
+        self._lock = Lock()
+
+    def get_index(self):
+        version, items, _ = self.reference_cache.get()
+        index_version, index = self._index
+        if index_version != version:
+            with self._lock:
+                index_version, index = self._index
+                if index_version != version:
+                    index = AutocompleteIndex(items)
+                    self._index = (version, index)
+        return index
+
+    def search(self, query, limit):
+        return self.get_index().search(query, limit)
+
+
+ingredient_autocomplete = IngredientAutocomplete(ingredients_cache)
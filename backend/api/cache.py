@@ -0,0 +1,227 @@
+from collections import namedtuple
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+from recipes.models import Ingredient, Tag
+from recipes.versions import (
+    bump_selected_versions_on_commit, bump_versions_on_commit, get_version,
+    get_versions
+)
+from users.models import Follow
+from .serializers import IngredientSerializer, TagSerializer
+
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+
+ReferenceVersion = namedtuple('ReferenceVersion', ('value', 'updated'))
+
+
+class ReferenceCache:
+    """Версионный кэш справочника.
+
+    Первый уровень — память процесса, второй — кэш Django. Версия
+    хранится в таблице ``Version``, поэтому сброс в одном процессе, в том
+    числе в команде импорта, виден всем остальным. Номер версии служит
+    для ETag, время её изменения — для Last-Modified.
+    """
+
+    def __init__(self, name, queryset, serializer_class):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._local = None
+
+    @property
+    def version_key(self):
+        return f'reference:{self.name}:version'
+
+    def get_version(self):
+        return ReferenceVersion(*get_version(self.version_key))
+
+    def invalidate(self):
+        bump_versions_on_commit([self.version_key])
+
+    def get(self):
+        """Возвращает (``ReferenceVersion``, список объектов, объекты по id).
+        """
+        version = self.get_version()
+        local = self._local
+        if local is not None and local[0] == version:
+            return local
+        key = f'reference:{self.name}:{version.value}'
+        items = cache.get(key)
+        if items is None:
+            items = [
+                dict(item) for item in self.serializer_class(
+                    self.queryset.all(), many=True
+                ).data
+            ]
+            cache.set(key, items, timeout=REFERENCE_CACHE_TIMEOUT)
+        local = (version, items, {item['id']: item for item in items})
+        self._local = local
+        return local
+
+
+tags_cache = ReferenceCache('tags', Tag.objects.all(), TagSerializer)
+ingredients_cache = ReferenceCache(
+    'ingredients', Ingredient.objects.all(), IngredientSerializer
+)
+
+
+class RecipeResponseCache:
+    """Кэш ответов ленты рецептов для анонимных пользователей.
+
+    Ключ списка строится из нормализованной строки запроса и версии
+    ленты, ключ рецепта — из версии этого рецепта. Версии справочников
+    входят в оба ключа, так что правка тега или ингредиента сбрасывает
+    всё сразу. Схема и хост тоже входят в ключ: ссылки на картинки в
+    ответе абсолютные. Версии лежат в таблице ``Version``, ответы —
+    в ``cache``.
+
+    Счётчики попаданий и промахов лежат в ``cache`` и при локальном
+    кэше (``CACHE_BACKEND`` по умолчанию) считаются в каждом процессе
+    отдельно.
+    """
+    feed_version_key = 'recipes:feed:version'
+    hits_key = 'recipes:cache:hits'
+    misses_key = 'recipes:cache:misses'
+    timeout = 10 * 60
+
+    @staticmethod
+    def recipe_version_key(pk):
+        return f'recipes:recipe:{pk}:version'
+
+    @staticmethod
+    def get_versions(keys):
+        versions = get_versions(keys)
+        return [versions[key] for key in keys]
+
+    @staticmethod
+    def normalize_query(query_params):
+        params = []
+        for key in sorted(query_params):
+            values = sorted(value for value in query_params.getlist(key)
+                            if value)
+            if key == 'page' and values == ['1']:
+                continue
+            if values:
+                params.append(f'{key}={",".join(values)}')
+        return '&'.join(params)
+
+    def get_key(self, request, pk=None):
+        if pk is None:
+            versions = self.get_versions([
+                self.feed_version_key, tags_cache.version_key,
+                ingredients_cache.version_key
+            ])
+            query = self.normalize_query(request.query_params)
+        else:
+            versions = self.get_versions([
+                self.recipe_version_key(pk), tags_cache.version_key,
+                ingredients_cache.version_key
+            ])
+            query = ''
+        digest = md5(self.get_origin(request, query).encode()).hexdigest()
+        kind = 'list' if pk is None else f'detail:{pk}'
+        return f'recipes:{kind}:{":".join(map(str, versions))}:{digest}'
+
+    @staticmethod
+    def get_origin(request, query):
+        return f'{request.scheme}://{request.get_host()}?{query}'
+
+    def get(self, key):
+        data = cache.get(key)
+        self.count(self.misses_key if data is None else self.hits_key)
+        return data
+
+    def set(self, key, data):
+        cache.set(key, data, timeout=self.timeout)
+
+    @staticmethod
+    def count(key):
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    def stats(self):
+        """Попадания и промахи процесса, который отвечает на запрос."""
+        counters = cache.get_many([self.hits_key, self.misses_key])
+        hits = counters.get(self.hits_key, 0)
+        misses = counters.get(self.misses_key, 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+    def get_version_keys(self, pks):
+        """Версии, которые устаревают при изменении рецептов ``pks``."""
+        return [self.feed_version_key, *map(self.recipe_version_key, pks)]
+
+    def invalidate_recipes(self, pks):
+        bump_versions_on_commit(self.get_version_keys(pks))
+
+
+recipe_response_cache = RecipeResponseCache()
+
+
+class FeedHeadCache:
+    """Кэш первой страницы ленты подписок для каждого пользователя.
+
+    Ключ содержит версию ленты пользователя: она меняется вместе с его
+    подписками, избранным или списком покупок, а также когда автор из
+    подписок публикует или правит рецепт. Версии всех подписчиков
+    автора увеличиваются одним запросом, так что чтение страницы из
+    кэша не зависит от числа подписок. ``RECIPE_FEED_CACHE_TIMEOUT = 0``
+    отключает кэш.
+    """
+
+    version_prefix = 'recipes:feed:user:'
+    version_suffix = ':version'
+
+    @property
+    def timeout(self):
+        return settings.RECIPE_FEED_CACHE_TIMEOUT
+
+    def version_key(self, user_id):
+        return f'{self.version_prefix}{user_id}{self.version_suffix}'
+
+    def get_key(self, request):
+        user_id = request.user.pk
+        version, = RecipeResponseCache.get_versions(
+            [self.version_key(user_id)]
+        )
+        query = RecipeResponseCache.normalize_query(request.query_params)
+        digest = md5(
+            RecipeResponseCache.get_origin(request, query).encode()
+        ).hexdigest()
+        return f'recipes:feed:head:{user_id}:{version}:{digest}'
+
+    def get(self, key):
+        return cache.get(key)
+
+    def set(self, key, data):
+        cache.set(key, data, timeout=self.timeout)
+
+    def invalidate_users(self, user_ids):
+        bump_versions_on_commit(map(self.version_key, user_ids))
+
+    def invalidate_author(self, author_id):
+        """Устаревает ленты подписчиков автора после коммита."""
+        followers = Follow.objects.filter(author_id=author_id).annotate(
+            name=Concat(
+                Value(self.version_prefix), Cast('user_id', CharField()),
+                Value(self.version_suffix),
+                output_field=CharField()
+            )
+        ).values('name')
+        bump_selected_versions_on_commit(('feed', author_id), followers)
+
+
+feed_head_cache = FeedHeadCache()
@@ -0,0 +1,104 @@
+from threading import local
+
+from django.db import connection, transaction
+
+from recipes.matching import match_index
+from recipes.search import get_backend
+from recipes.versions import bump_versions
+from .cache import recipe_response_cache
+from .documents import update_documents
+
+
+class RecipeChanges:
+    """Рецепты, изменённые и удалённые в одной транзакции.
+
+    Вызывается после коммита: поисковый индекс, индекс ингредиентов
+    и документы обновляются один раз для всех рецептов сразу.
+    Удалённые рецепты только убираются из индексов. Кэш ответов
+    сбрасывается последним, чтобы в него не попали старые документы.
+    """
+
+    def __init__(self):
+        self.search = set()
+        self.match = set()
+        self.documents = set()
+        self.removed = set()
+        self.finished = False
+
+    @property
+    def updated(self):
+        return (self.search | self.match | self.documents) - self.removed
+
+    def __call__(self):
+        self.finished = True
+        search = self.search - self.removed
+        match = self.match - self.removed
+        documents = self.documents - self.removed
+        if search:
+            get_backend().update(search)
+        if match:
+            match_index.update(match)
+        if documents:
+            update_documents(documents)
+        if search or match or documents:
+            bump_versions(recipe_response_cache.get_version_keys(self.updated))
+        if self.removed:
+            get_backend().remove(self.removed)
+            match_index.remove(self.removed)
+
+
+class PendingRecipeChanges:
+    """Копит изменения рецептов до коммита текущей транзакции.
+
+    Сигналы строк рецепта (ингредиенты, каскадное удаление) срабатывают
+    по разу на строку; здесь они сливаются в один колбэк ``on_commit``.
+    После отката колбэк выбрасывается вместе с остальными, и следующая
+    транзакция начинает новый набор.
+    """
+
+    def __init__(self):
+        self._local = local()
+
+    def clear(self):
+        """Начинает новый набор, оставив прежний колбэк как есть."""
+        self._local.changes = None
+
+    def get_changes(self):
+        changes = getattr(self._local, 'changes', None)
+        if changes is None or changes.finished or not any(
+            callback is changes for _, callback in connection.run_on_commit
+        ):
+            changes = self._local.changes = RecipeChanges()
+            transaction.on_commit(changes)
+        return changes
+
+    def add(self, **recipe_ids):
+        """Принимает списки id по видам: ``search``, ``match``,
+        ``documents`` и ``removed``.
+        """
+        if connection.in_atomic_block:
+            changes = self.get_changes()
+        else:
+            changes = RecipeChanges()
+        for kind, ids in recipe_ids.items():
+            getattr(changes, kind).update(ids)
+        if not connection.in_atomic_block:
+            changes()
+
+
+pending_recipe_changes = PendingRecipeChanges()
+
+
+def schedule_recipe_update(recipe_ids, search=True, match=True,
+                           documents=True):
+    """Обновляет рецепты в индексах и документах после коммита."""
+    recipe_ids = list(recipe_ids)
+    pending_recipe_changes.add(**{
+        kind: recipe_ids for kind, enabled in (
+            ('search', search), ('match', match), ('documents', documents)
+        ) if enabled
+    })
+
+
+def schedule_recipe_removal(recipe_ids):
+    pending_recipe_changes.add(removed=recipe_ids)
@@ -0,0 +1,158 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import BooleanField, Prefetch, Value
+from rest_framework import serializers
+
+from recipes.models import IngredientAmount, Recipe, RecipeDocument, Tag
+from .serializers import RecipeReadSerializer
+
+DOCUMENTS_CHUNK_SIZE = 500
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_source_queryset():
+    """Рецепты со всем, что нужно ``RecipeReadSerializer``."""
+    return Recipe.objects.select_related('author').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.all()),
+        Prefetch(
+            'ingredient',
+            queryset=IngredientAmount.objects.select_related(
+                'ingredients'
+            ).order_by('ingredients__name')
+        )
+    ).annotate(**dict.fromkeys(
+        (*USER_FLAGS, 'is_subscribed'),
+        Value(False, output_field=BooleanField())
+    ))
+
+
+def build_documents(recipe_ids):
+    """Возвращает {id рецепта: документ} без флагов пользователя.
+
+    Сериализатору не передаётся запрос, поэтому ссылки на картинки
+    в документе относительные.
+    """
+    documents = {}
+    for recipe in get_source_queryset().filter(pk__in=recipe_ids):
+        data = RecipeReadSerializer(recipe).data
+        for flag in USER_FLAGS:
+            del data[flag]
+        if data['author'] is not None:
+            del data['author']['is_subscribed']
+        documents[recipe.pk] = data
+    return documents
+
+
+def save_documents(documents, replace=True):
+    """Записывает документы; без ``replace`` существующие не трогает."""
+    recipe_ids = list(documents)
+    with transaction.atomic():
+        if replace:
+            RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeDocument.objects.bulk_create(
+            (RecipeDocument(recipe_id=recipe_id, data=data)
+             for recipe_id, data in documents.items()),
+            ignore_conflicts=True
+        )
+
+
+def update_documents(recipe_ids):
+    """Пересобирает документы рецептов порциями; возвращает их число.
+
+    Строки рецептов блокируются до записи документов: из двух
+    одновременных пересборок вторая ждёт первую и читает уже её данные,
+    поэтому старый снимок не может перезаписать новый.
+    """
+    count = 0
+    recipe_ids = iter(recipe_ids)
+    while True:
+        chunk = list(islice(recipe_ids, DOCUMENTS_CHUNK_SIZE))
+        if not chunk:
+            return count
+        with transaction.atomic():
+            chunk = list(Recipe.objects.select_for_update().filter(
+                pk__in=chunk
+            ).order_by('pk').values_list('pk', flat=True))
+            documents = build_documents(chunk)
+            save_documents(documents)
+        count += len(documents)
+
+
+def schedule_document_update(recipe_ids):
+    """Пересобирает документы после коммита транзакции.
+
+    ``recipe_ids`` может быть запросом: он выполнится уже после коммита.
+    """
+    transaction.on_commit(lambda: update_documents(recipe_ids))
+
+
+def fill_missing_documents(recipes):
+    """Достраивает документы рецептов, загруженных без них.
+
+    Документ, который успела записать пересборка после изменения
+    рецепта, новее этого снимка и не заменяется.
+    """
+    missing = {
+        recipe.pk: recipe for recipe in recipes
+        if recipe.document_data is None
+    }
+    if missing:
+        documents = build_documents(missing)
+        save_documents(documents, replace=False)
+        for recipe_id, data in documents.items():
+            missing[recipe_id].document_data = data
+
+
+class RecipeDocumentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data)
+        fill_missing_documents(recipes)
+        return [
+            self.child.to_representation(recipe) for recipe in recipes
+            if recipe.document_data is not None
+        ]
+
+
+class RecipeDocumentSerializer(serializers.BaseSerializer):
+    """Ответ из готового документа рецепта и флагов текущего пользователя.
+
+    Повторяет формат ``RecipeReadSerializer``. Рецепты должны быть
+    загружены с аннотациями ``document_data``, ``is_favorited``,
+    ``is_in_shopping_cart`` и ``is_subscribed``.
+    """
+
+    class Meta:
+        list_serializer_class = RecipeDocumentListSerializer
+
+    def to_representation(self, instance):
+        if instance.document_data is None:
+            fill_missing_documents([instance])
+        document = instance.document_data
+        author = document['author']
+        if author is not None:
+            author = {**author, 'is_subscribed': instance.is_subscribed}
+        images = document['images']
+        if images is not None:
+            images = {
+                size: self.get_url(url) for size, url in images.items()
+            }
+        return {
+            'id': document['id'],
+            'tags': document['tags'],
+            'author': author,
+            'ingredients': document['ingredients'],
+            'is_favorited': instance.is_favorited,
+            'is_in_shopping_cart': instance.is_in_shopping_cart,
+            'name': document['name'],
+            'image': self.get_url(document['image']),
+            'images': images,
+            'text': document['text'],
+            'cooking_time': document['cooking_time'],
+        }
+
+    def get_url(self, url):
+        request = self.context.get('request')
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
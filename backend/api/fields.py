@@ -0,0 +1,61 @@
+import base64
+import binascii
+
+from django.conf import settings
+from rest_framework import serializers
+
+from recipes.images import (
+    ImageProcessingError, decode_base64, has_image_signature, validate_image
+)
+from recipes.uploads import TOKEN_PREFIX, get_upload
+
+SIGNATURE_BASE64_LENGTH = 16
+
+
+class Base64ImagePayloadField(serializers.ImageField):
+    """Картинка в base64, которая не перекодируется в потоке запроса.
+
+    Проверяются размер, сигнатура формата и то, что картинка
+    декодируется; миниатюры и перекодирование делает ``recipes.images``
+    в фоне. Возвращает строку base64 без префикса ``data:``.
+
+    Вместо base64 можно передать токен ``upload:<...>``, полученный
+    от ``POST /api/recipes/images/``; тогда возвращается путь к уже
+    загруженному файлу.
+    """
+    default_error_messages = {
+        'invalid_image': 'Загрузите картинку в формате JPEG, PNG, GIF '
+                         'или WebP в кодировке base64.',
+        'too_large': 'Размер картинки не должен превышать {max_size} байт.',
+        'invalid_upload': 'Загрузка не найдена или срок её действия истёк.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid_image')
+        if data.startswith(TOKEN_PREFIX):
+            path = get_upload(
+                data[len(TOKEN_PREFIX):], self.context['request'].user
+            )
+            if path is None:
+                self.fail('invalid_upload')
+            return path
+        if data.startswith('data:'):
+            header, separator, data = data.partition(',')
+            if not separator or not header.endswith(';base64'):
+                self.fail('invalid_image')
+        payload = data.strip()
+        max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        if len(payload) // 4 * 3 > max_size:
+            self.fail('too_large', max_size=max_size)
+        try:
+            header = base64.b64decode(payload[:SIGNATURE_BASE64_LENGTH])
+        except (binascii.Error, ValueError):
+            self.fail('invalid_image')
+        if not has_image_signature(header):
+            self.fail('invalid_image')
+        try:
+            validate_image(decode_base64(payload))
+        except ImageProcessingError:
+            self.fail('invalid_image')
+        return payload
@@ -1,20 +1,105 @@
-from django_filters import AllValuesMultipleFilter, rest_framework
+import re
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
+from django_filters import rest_framework
 from django_filters.widgets import BooleanWidget
 from rest_framework.filters import SearchFilter
 
+from recipes.matching import match_recipes
 from recipes.models import Recipe
+from recipes.search import search_recipes
+
+RecipeTag = Recipe.tags.through
+
+POPULAR_ORDERING = 'popular'
+ORDERINGS = {
+    POPULAR_ORDERING: ('-favorites_count', '-pub_date', '-id'),
+}
 
 
 class IngredientSearchFilter(SearchFilter):
     search_param = 'name'
 
 
+class ValueListField(forms.Field):
+    """Список значений параметра, проверяемых регулярным выражением.
+
+    В отличие от ``AllValuesMultipleFilter`` не строит список допустимых
+    значений запросом к базе.
+    """
+    widget = forms.SelectMultiple
+    default_error_messages = {
+        'invalid_value': 'Недопустимое значение: %(value)s.',
+    }
+
+    def __init__(self, *, pattern, **kwargs):
+        self.pattern = re.compile(pattern)
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if not value:
+            return []
+        return [item for item in value if item]
+
+    def validate(self, value):
+        super().validate(value)
+        for item in value:
+            if not self.pattern.fullmatch(item):
+                raise ValidationError(
+                    self.error_messages['invalid_value'],
+                    code='invalid_value',
+                    params={'value': item},
+                )
+
+
+class ValueListFilter(rest_framework.Filter):
+    field_class = ValueListField
+
+
 class RecipeFilter(rest_framework.FilterSet):
     is_in_shopping_cart = rest_framework.BooleanFilter(widget=BooleanWidget())
     is_favorited = rest_framework.BooleanFilter(widget=BooleanWidget())
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
-    author = AllValuesMultipleFilter(field_name='author__id')
+    tags = ValueListFilter(method='filter_tags', pattern=r'[-a-zA-Z0-9_]+')
+    author = ValueListFilter(field_name='author_id', lookup_expr='in',
+                             pattern=r'\d+')
+    search = rest_framework.CharFilter(method='filter_search')
+    ordering = rest_framework.ChoiceFilter(
+        choices=((POPULAR_ORDERING, 'По популярности'),),
+        method='filter_ordering'
+    )
+    # Объявлен последним: учитывает уже применённые фильтры.
+    have = ValueListFilter(method='filter_have', pattern=r'\d+')
 
     class Meta:
         model = Recipe
-        fields = ['author__id', 'tags__slug']
+        fields = ('is_in_shopping_cart', 'is_favorited', 'tags', 'author',
+                  'search', 'ordering', 'have')
+
+    def filter_tags(self, queryset, name, value):
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe_id=OuterRef('pk'), tag__slug__in=value
+        )))
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        return search_recipes(queryset, value) if value else queryset
+
+    def filter_have(self, queryset, name, value):
+        if not value:
+            return queryset
+        data = self.form.cleaned_data
+        allowed = None
+        if any(data.get(field) not in (None, '') for field in (
+            'is_favorited', 'is_in_shopping_cart', 'search'
+        )):
+            allowed = queryset
+        return match_recipes(
+            queryset, map(int, value),
+            authors={int(author) for author in data.get('author') or ()},
+            tags=set(data.get('tags') or ()), allowed=allowed
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
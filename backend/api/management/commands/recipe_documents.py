@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.documents import update_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает готовые документы рецептов'
+
+    def handle(self, *args, **options):
+        count = update_documents(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано документов: {count}'
+        ))
@@ -0,0 +1,180 @@
+import hmac
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS = (
+    ('requests_total', 'counter', 'Число запросов.'),
+    ('request_seconds_total', 'counter', 'Время обработки запросов.'),
+    ('db_queries_total', 'counter', 'Число SQL-запросов.'),
+    ('db_seconds_total', 'counter', 'Время выполнения SQL-запросов.'),
+    ('render_seconds_total', 'counter', 'Время рендеринга ответов.'),
+    ('response_bytes_total', 'counter', 'Размер ответов без потоковых.'),
+    ('query_budget_exceeded_total', 'counter',
+     'Число запросов сверх бюджета SQL-запросов.'),
+)
+
+
+class RequestStats:
+    """Стоимость одного запроса: SQL-запросы, время базы и рендеринга."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class MetricsRegistry:
+    """Счётчики по эндпоинтам в памяти процесса.
+
+    Каждый процесс отдаёт свои счётчики, складывает их Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._values = defaultdict(float)
+
+    def record(self, endpoint, status, stats, duration, size,
+               over_budget=False):
+        labels = (endpoint, str(status))
+        with self._lock:
+            for name, value in (
+                ('requests_total', 1),
+                ('request_seconds_total', duration),
+                ('db_queries_total', stats.queries),
+                ('db_seconds_total', stats.db_time),
+                ('render_seconds_total', stats.render_time),
+                ('response_bytes_total', size),
+                ('query_budget_exceeded_total', int(over_budget)),
+            ):
+                self._values[name, labels] += value
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = []
+        for name, kind, help_text in METRICS:
+            lines.append(f'# HELP foodgram_{name} {help_text}')
+            lines.append(f'# TYPE foodgram_{name} {kind}')
+            for (metric, (endpoint, status)), value in values:
+                if metric == name:
+                    lines.append(
+                        f'foodgram_{name}{{endpoint="{escape(endpoint)}",'
+                        f'status="{status}"}} {value:g}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return (value.replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+registry = MetricsRegistry()
+
+
+def get_endpoint(request, view_func):
+    """Имя эндпоинта: ``RecipeViewSet.list``, ``RecipeViewSet.feed``."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class InstrumentationMiddleware:
+    """Считает SQL-запросы и время обработки каждого запроса.
+
+    Итоги копятся в ``registry`` и отдаются в заголовке Server-Timing.
+    Если эндпоинт сделал больше запросов, чем указано в
+    ``QUERY_BUDGETS``, превышение учитывается в метриках и пишется
+    предупреждение: ответ к этому времени уже готов, а транзакция
+    закрыта. Сами бюджеты проверяют тесты.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = request.request_stats = RequestStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats.execute))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        endpoint = getattr(request, 'metrics_endpoint', None)
+        if endpoint is None:
+            return response
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};'
+                f'desc="{stats.queries} queries", '
+                f'render;dur={stats.render_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        budget = settings.QUERY_BUDGETS.get(endpoint)
+        over_budget = budget is not None and stats.queries > budget
+        size = 0 if response.streaming else len(response.content)
+        registry.record(
+            endpoint, response.status_code, stats, duration, size,
+            over_budget
+        )
+        if over_budget:
+            logger.warning(
+                '%s: %s SQL-запросов при бюджете %s',
+                endpoint, stats.queries, budget
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_endpoint = get_endpoint(request, view_func)
+
+    def process_template_response(self, request, response):
+        stats = getattr(request, 'request_stats', None)
+        if stats is None:
+            return response
+        started = time.perf_counter()
+
+        def finish(response):
+            stats.render_time += time.perf_counter() - started
+
+        response.add_post_render_callback(finish)
+        return response
+
+
+def metrics_view(request):
+    """Счётчики в текстовом формате Prometheus.
+
+    Нужен заголовок ``Authorization: Bearer <METRICS_TOKEN>``; пока токен
+    не задан, адреса как будто нет.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {token}'.encode()
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type=PROMETHEUS_CONTENT_TYPE
+    )
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Версии переехали в ``recipes.Version``, таблица кэша больше не нужна."""
+
+    dependencies = [
+        ('api', '0001_shared_cache_table'),
+        ('recipes', '0017_version_indexchange'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'DROP TABLE IF EXISTS foodgram_shared_cache',
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -1,8 +1,108 @@
-from django.db.models import F
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
 
 
 class IngredientMixin:
     def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id', 'name', 'measurement_unit', amount=F('recipe__amount')
+        return [
+            {
+                'id': item.ingredients.id,
+                'name': item.ingredients.name,
+                'measurement_unit': item.ingredients.measurement_unit,
+                'amount': item.amount,
+            } for item in obj.ingredient.all()
+        ]
+
+
+class RecipeImagesMixin:
+    def get_images(self, obj):
+        """Ссылки на миниатюры; пока их нет, отдаётся исходная картинка."""
+        if not obj.image:
+            return None
+        request = self.context.get('request')
+
+        def get_url(name):
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        original = get_url(obj.image.name)
+        return {
+            size: get_url(obj.thumbnails[size])
+            if size in obj.thumbnails else original
+            for size in settings.RECIPE_IMAGE_SIZES
+        }
+
+
+class ReferenceCacheMixin:
+    """Отдаёт справочник из ``reference_cache`` с ETag и Last-Modified."""
+    reference_cache = None
+
+    def filter_items(self, items):
+        return items
+
+    def list(self, request, *args, **kwargs):
+        version, items, _ = self.reference_cache.get()
+        return self.cached_response(
+            request, version, lambda: self.filter_items(items)
         )
+
+    def retrieve(self, request, *args, **kwargs):
+        version, _, by_id = self.reference_cache.get()
+        try:
+            item = by_id[int(kwargs[self.lookup_field])]
+        except (KeyError, ValueError):
+            raise Http404
+        return self.cached_response(request, version, lambda: item)
+
+    def cached_response(self, request, version, get_data):
+        etag = f'"{self.reference_cache.name}-{version.value}"'
+        last_modified = None
+        if version.updated is not None:
+            last_modified = int(version.updated.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(get_data())
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class AnonymousCacheMixin:
+    """Кэширует ответы списка и детальной страницы для анонимов."""
+    response_cache = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_or_fresh(
+            request, None, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        if not str(pk).isdigit():
+            return get_response()
+        return self.cached_or_fresh(request, pk, get_response)
+
+    def cached_or_fresh(self, request, pk, get_response):
+        if request.user.is_authenticated:
+            return get_response()
+        key = self.response_cache.get_key(request, pk)
+        data = self.response_cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = get_response()
+        if response.status_code == 200:
+            self.response_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -1,6 +1,28 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    """Постраничный вывод по курсору (pub_date, id) без OFFSET и COUNT.
+
+    Включается параметром ``?cursor=`` (пустым для первой страницы).
+    Ответ сохраняет поле ``count``, но оно всегда равно ``null``.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
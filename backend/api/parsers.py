@@ -0,0 +1,123 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    SkipFile, TemporaryFileUploadHandler
+)
+from django.http.multipartparser import (
+    MultiPartParser as DjangoMultiPartParser, MultiPartParserError
+)
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import (
+    BaseParser, DataAndFiles, JSONParser, MultiPartParser
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+IMAGE_FIELD = 'image'
+
+
+class UploadTooLarge(APIException):
+    status_code = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой.'
+    default_code = 'too_large'
+
+
+class FastJSONParser(JSONParser):
+    """JSON через orjson, если он установлен и тело в UTF-8."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as error:
+            raise ParseError(f'JSON parse error - {error}')
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет картинку кусками во временный файл и следит за размером.
+
+    В памяти держится не больше одного куска, поэтому расход памяти
+    не зависит от размера файла. Принимается только поле ``image``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        self.received = 0
+
+    def too_large(self):
+        return UploadTooLarge(
+            f'Размер картинки не должен превышать {self.max_size} байт.'
+        )
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != IMAGE_FIELD:
+            raise SkipFile()
+        super().new_file(field_name, *args, **kwargs)
+        if self.content_length and self.content_length > self.max_size:
+            self.upload_interrupted()
+            raise self.too_large()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.upload_interrupted()
+            raise self.too_large()
+        return super().receive_data_chunk(raw_data, start)
+
+
+class ImageMultiPartParser(MultiPartParser):
+    """multipart/form-data с файлом в поле ``image``."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context['request']
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta['CONTENT_TYPE'] = media_type
+        parser = DjangoMultiPartParser(
+            meta, stream, [LimitedUploadHandler(request)], encoding
+        )
+        try:
+            data, files = parser.parse()
+        except MultiPartParserError as error:
+            raise ParseError(f'Ошибка разбора multipart: {error}')
+        return DataAndFiles(data, files)
+
+
+class RawImageParser(BaseParser):
+    """Тело запроса целиком — картинка (``Content-Type: image/*``)."""
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError('Пустое тело запроса.')
+        parser_context = parser_context or {}
+        request = parser_context['request']
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        handler = LimitedUploadHandler(request)
+        handler.new_file(
+            IMAGE_FIELD, IMAGE_FIELD, media_type, content_length or None
+        )
+        size = 0
+        while True:
+            chunk = stream.read(handler.chunk_size)
+            if not chunk:
+                break
+            handler.receive_data_chunk(chunk, size)
+            size += len(chunk)
+        return DataAndFiles({}, {IMAGE_FIELD: handler.file_complete(size)})
+
+
+class OctetStreamImageParser(RawImageParser):
+    media_type = 'application/octet-stream'
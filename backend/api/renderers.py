@@ -0,0 +1,190 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from recipes.units import humanize_amount
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FALLBACK_FONT_NAME = 'Helvetica'
+STREAM_CHUNK_SIZE = 64 * 1024
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if orjson is not None else None
+)
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Компактный JSON через orjson, если он установлен.
+
+    Отступы (``Accept: application/json; indent=4``, Browsable API),
+    ``UNICODE_JSON = False`` и данные, которые orjson не умеет
+    сериализовать, обрабатываются стандартным ``JSONRenderer``. Даты
+    и неизвестные orjson типы передаются кодировщику DRF, так что
+    значения те же, что у ``JSONRenderer``; запись чисел с плавающей
+    точкой может отличаться (``1e20`` и ``1e+20``), а NaN orjson
+    отдаёт как ``null``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            content = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in content:
+                content = content.replace(separator, escaped)
+        return content
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    ``stream`` лениво превращает строки списка покупок в куски ответа
+    для ``StreamingHttpResponse``. ``render`` нужен DRF для ответов
+    с ошибками и для обычного ``Response``; текст ошибки всегда
+    в UTF-8, даже у рендереров без ``charset``.
+    """
+    charset = 'utf-8'
+
+    def stream(self, ingredients):
+        raise NotImplementedError(
+            'ShoppingCartRenderer.stream() must be implemented.'
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return str(data.get('detail', data)).encode(
+                self.charset or 'utf-8'
+            )
+        return b''.join(
+            chunk.encode(self.charset) if isinstance(chunk, str) else chunk
+            for chunk in self.stream(data)
+        )
+
+    @staticmethod
+    def format_amount(ingredient):
+        return humanize_amount(
+            ingredient['amount'], ingredient['measurement_unit']
+        )
+
+    def format_line(self, ingredient):
+        amount, unit = self.format_amount(ingredient)
+        return f'{ingredient["name"]} - {amount}{unit}'
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield f'{self.format_line(ingredient)}\n'
+
+
+class Echo:
+    """Псевдобуфер: csv.writer пишет в него, а строка сразу отдаётся."""
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Количество', 'Единица измерения')
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield '\ufeff' + writer.writerow(self.header)
+        for ingredient in ingredients:
+            yield writer.writerow(
+                (ingredient['name'], *self.format_amount(ingredient))
+            )
+
+
+class PDFShoppingCartRenderer(ShoppingCartRenderer):
+    """Постраничный PDF.
+
+    reportlab собирает документ целиком, поэтому он пишется во временный
+    файл, который сбрасывается на диск при превышении
+    ``STREAM_CHUNK_SIZE``, и затем отдаётся кусками.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    title = 'Список покупок'
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def stream(self, ingredients):
+        font_name = self.get_font_name()
+        _, height = A4
+        with SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as buffer:
+            pdf = canvas.Canvas(buffer, pagesize=A4)
+            pdf.setTitle(self.title)
+            page = 1
+            y = self.start_page(pdf, font_name, height, page)
+            for ingredient in ingredients:
+                if y < self.margin:
+                    pdf.showPage()
+                    page += 1
+                    y = self.start_page(pdf, font_name, height, page)
+                pdf.drawString(
+                    self.margin, y, f'• {self.format_line(ingredient)}'
+                )
+                y -= self.line_height
+            pdf.save()
+            buffer.seek(0)
+            yield from iter(lambda: buffer.read(STREAM_CHUNK_SIZE), b'')
+
+    def start_page(self, pdf, font_name, height, page):
+        y = height - self.margin
+        pdf.setFont(font_name, self.font_size + 4)
+        pdf.drawString(self.margin, y, f'{self.title} ({page})')
+        pdf.setFont(font_name, self.font_size)
+        return y - 2 * self.line_height
+
+    @staticmethod
+    def get_font_name():
+        if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return PDF_FONT_NAME
+        font_path = settings.SHOPPING_CART_PDF_FONT
+        if not os.path.exists(font_path):
+            return PDF_FALLBACK_FONT_NAME
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+        return PDF_FONT_NAME
+
+
+SHOPPING_CART_RENDERERS = (
+    TextShoppingCartRenderer,
+    CSVShoppingCartRenderer,
+    PDFShoppingCartRenderer,
+)
@@ -1,4 +1,7 @@
+from pathlib import Path
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
@@ -7,8 +10,12 @@ from rest_framework.validators import UniqueValidator
 from recipes.models import (
     Ingredient, IngredientAmount, Recipe, Tag
 )
+from recipes.services import update_cart_totals_for_recipe
 from users.models import Follow
-from .mixins import IngredientMixin
+from recipes.images import schedule_recipe_image
+from recipes.uploads import claimed_upload
+from .fields import Base64ImagePayloadField
+from .mixins import IngredientMixin, RecipeImagesMixin
 
 User = get_user_model()
 
@@ -39,6 +46,8 @@ class CustomUserSerializer(UserSerializer):
         read_only_fields = 'is_subscribed',
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -66,24 +75,31 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'slug', 'color')
 
 
-class RecipeReadSerializer(IngredientMixin, serializers.ModelSerializer):
+class RecipeReadSerializer(IngredientMixin, RecipeImagesMixin,
+                           serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     author = CustomUserSerializer()
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.BooleanField(default=False)
     is_in_shopping_cart = serializers.BooleanField(default=False)
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name', 'image',
-                  'text', 'cooking_time',)
+                  'images', 'text', 'cooking_time',)
+
+    def to_representation(self, instance):
+        if instance.author and hasattr(instance, 'is_subscribed'):
+            instance.author.is_subscribed = instance.is_subscribed
+        return super().to_representation(instance)
 
 
 class RecipeWriteSerializer(IngredientMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     ingredients = AddIngredientToRecipeSerializer(many=True)
-    image = Base64ImageField(use_url=True, max_length=None)
+    image = Base64ImagePayloadField(use_url=True, max_length=None)
 
     class Meta:
         model = Recipe
@@ -91,37 +107,91 @@ class RecipeWriteSerializer(IngredientMixin, serializers.ModelSerializer):
                   'image', 'text', 'cooking_time')
 
     def validate(self, data):
-        ingredients = data.get('ingredients', None)
-        ingredients_set = set()
-        for ingredient in ingredients:
-            if type(ingredient.get('amount')) is str:
-                if not ingredient.get('amount').isdigit():
-                    raise serializers.ValidationError(
-                        ('Количество ингредиента должно быть числом')
-                    )
-            if int(ingredient.get('amount')) <= 0:
-                raise serializers.ValidationError(
-                    ('Минимальное количество ингридиентов 0,1')
-                )
-            if int(data['cooking_time']) <= 0:
-                raise serializers.ValidationError(
-                    'Время готовки должно быть больше нуля'
-                )
-            ingredient_id = ingredient.get('id')
-            if ingredient_id in ingredients_set:
+        errors = {}
+        ingredients = data.get('ingredients')
+        if ingredients is not None:
+            ingredient_errors = self.__validate_ingredients(ingredients)
+            if ingredient_errors:
+                errors['ingredients'] = ingredient_errors
+        tags = self.initial_data.get('tags')
+        if tags is None:
+            if not self.partial:
+                errors['tags'] = ['Обязательное поле.']
+        else:
+            tags, tag_errors = self.__validate_tags(tags)
+            if tag_errors:
+                errors['tags'] = tag_errors
+            data['tags'] = tags
+        cooking_time = data.get('cooking_time')
+        if cooking_time is not None and cooking_time <= 0:
+            errors['cooking_time'] = ['Время готовки должно быть больше нуля']
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+    def save(self, **kwargs):
+        """Сохраняет рецепт, забрав загрузку картинки в той же транзакции.
+
+        Токен загрузки тратится, только если рецепт сохранён: при ошибке
+        транзакция откатывается, а файл возвращается на место.
+        """
+        image = self.validated_data.get('image')
+        if not isinstance(image, Path):
+            return super().save(**kwargs)
+        with claimed_upload(image) as claimed, transaction.atomic():
+            if claimed is None:
                 raise serializers.ValidationError(
-                    'Ингредиент не должен повторяться.'
+                    {'image': 'Эта загрузка уже использована.'}
                 )
-            ingredients_set.add(ingredient_id)
-        data['ingredients'] = ingredients
-        return data
+            self.validated_data['image'] = claimed
+            return super().save(**kwargs)
+
+    @staticmethod
+    def __validate_ingredients(ingredients):
+        """Ошибки по каждому ингредиенту; существование — одним запросом."""
+        ids = {ingredient['id'] for ingredient in ingredients}
+        known = set(Ingredient.objects.filter(id__in=ids).values_list(
+            'id', flat=True
+        ))
+        seen = set()
+        errors = []
+        for ingredient in ingredients:
+            ingredient_id = ingredient['id']
+            item_errors = {}
+            if ingredient_id not in known:
+                item_errors['id'] = [f'Ингредиент {ingredient_id} не найден.']
+            elif ingredient_id in seen:
+                item_errors['id'] = ['Ингредиент не должен повторяться.']
+            if ingredient['amount'] <= 0:
+                item_errors['amount'] = [
+                    'Минимальное количество ингридиентов 0,1'
+                ]
+            seen.add(ingredient_id)
+            errors.append(item_errors)
+        return errors if any(errors) else None
+
+    @staticmethod
+    def __validate_tags(tags):
+        """Возвращает (id тегов, ошибки); существование — одним запросом."""
+        if not isinstance(tags, list):
+            return None, ['Ожидался список id тегов.']
+        try:
+            ids = [int(tag) for tag in tags]
+        except (TypeError, ValueError):
+            return None, ['Id тега должен быть числом.']
+        if len(set(ids)) != len(ids):
+            return None, ['Тег не должен повторяться.']
+        known = set(Tag.objects.filter(id__in=ids).values_list(
+            'id', flat=True
+        ))
+        errors = [f'Тег {tag} не найден.' for tag in ids if tag not in known]
+        return ids, errors
 
     @staticmethod
     def __add_tags_ingredients(instance, **validated_data):
         ingredients = validated_data['ingredients']
         tags = validated_data['tags']
-        for tag in tags:
-            instance.tags.add(tag)
+        instance.tags.set(tags)
 
         IngredientAmount.objects.bulk_create([IngredientAmount(
             recipe=instance,
@@ -131,35 +201,123 @@ class RecipeWriteSerializer(IngredientMixin, serializers.ModelSerializer):
         ])
         return instance
 
+    @staticmethod
+    def __sync_ingredients(instance, ingredients):
+        """Приводит строки ингредиентов рецепта к ``ingredients``.
+
+        Удаляет, обновляет и создаёт только изменившиеся строки и
+        возвращает количества до и после: {id ингредиента: количество}.
+        """
+        rows = {
+            row.ingredients_id: row
+            for row in IngredientAmount.objects.filter(recipe=instance)
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = [
+            row.pk for ingredient_id, row in rows.items()
+            if ingredient_id not in new_amounts
+        ]
+        if removed:
+            IngredientAmount.objects.filter(pk__in=removed).delete()
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            row = rows.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ('amount',))
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(
+                recipe=instance, ingredients_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in rows
+        ])
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
-        tags = self.initial_data.get('tags')
+        image = validated_data.pop('image')
+        tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(
             **validated_data,
             author=self.context.get('request').user
         )
+        schedule_recipe_image(recipe.pk, image)
         return self.__add_tags_ingredients(
             instance=recipe, ingredients=ingredients, tags=tags)
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.ingredients.clear()
-        instance.tags.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = self.initial_data.get('tags')
-        instance = self.__add_tags_ingredients(
-            instance, ingredients=ingredients, tags=tags)
-        return super().update(instance, validated_data)
+        # Блокируем рецепт, чтобы параллельные правки не считали
+        # разницу от одного и того же состояния.
+        Recipe.objects.select_for_update().filter(pk=instance.pk).exists()
+        ingredients = validated_data.pop('ingredients', None)
+        image = validated_data.pop('image', None)
+        if image:
+            schedule_recipe_image(instance.pk, image)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            old_amounts, new_amounts = self.__sync_ingredients(
+                instance, ingredients
+            )
+            update_cart_totals_for_recipe(instance, old_amounts, new_amounts)
+        changed = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        if changed:
+            instance.save(update_fields=changed)
+        return instance
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Списки id рецептов, которые нужно добавить и удалить."""
+    max_length = 100
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=max_length, default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=max_length, default=list
+    )
+
+    def validate(self, data):
+        data = {key: list(dict.fromkeys(ids)) for key, ids in data.items()}
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError(
+                'Передайте id рецептов в add или remove.'
+            )
+        both = set(data['add']) & set(data['remove'])
+        if both:
+            raise serializers.ValidationError(
+                'Рецепт не может быть одновременно в add и remove: '
+                + ', '.join(map(str, sorted(both)))
+            )
+        return data
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(RecipeImagesMixin, serializers.ModelSerializer):
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -179,11 +337,18 @@ class FollowSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(
             user=obj.user, author=obj.author
         ).exists()
 
     def get_recipes(self, obj):
+        recipes = self.context.get('recipes')
+        if recipes is not None:
+            return ShortRecipeSerializer(
+                recipes.get(obj.author_id, []), many=True
+            ).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         queryset = Recipe.objects.filter(author=obj.author)
@@ -192,6 +357,8 @@ class FollowSerializer(serializers.ModelSerializer):
         return ShortRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj.author).count()
 
     def validate(self, data):
@@ -1,17 +1,55 @@
-from django.db.models import F, Sum
+from collections import defaultdict
 
-from recipes.models import IngredientAmount
+from django.db.models import F, Sum, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import CartIngredient, Recipe
+from recipes.units import to_canonical_factor, to_canonical_unit
+
+SHOPPING_CART_CHUNK_SIZE = 500
 
 
 def get_list_ingridients(user):
-    ingredients = IngredientAmount.objects.filter(
-        recipe__cart__user=user
-    ).values(
-        name=F('ingredients__name'),
-        measurement_unit=F('ingredients__measurement_unit')
-    ).annotate(amount=Sum('amount')).order_by()
-    shopping_cart = ''.join(
-        f'{ing.get("name")} - {ing.get("amount")}'
-        f'{ing.get("measurement_unit")}\n' for ing in ingredients
+    """Лениво отдаёт строки списка покупок, не загружая их все в память.
+
+    Количества одного продукта в разных единицах (г и кг, мл и л)
+    переводятся в каноническую единицу и складываются одним запросом.
+    """
+    unit = 'ingredient__measurement_unit'
+    return CartIngredient.objects.filter(user=user).values(
+        name=F('ingredient__name'),
+        measurement_unit=to_canonical_unit(unit),
+    ).annotate(
+        amount=Sum(F('amount') * to_canonical_factor(unit))
+    ).order_by('name', 'measurement_unit').iterator(
+        chunk_size=SHOPPING_CART_CHUNK_SIZE
+    )
+
+
+def get_recipes_by_author(author_ids, limit=None):
+    """Возвращает рецепты авторов, сгруппированные по id автора.
+
+    Не более ``limit`` последних рецептов на автора выбираются одним
+    запросом с оконной функцией ROW_NUMBER.
+    """
+    queryset = Recipe.objects.filter(author_id__in=author_ids).only(
+        'id', 'name', 'image', 'thumbnails', 'cooking_time', 'author_id'
     )
-    return shopping_cart
+    if limit is None:
+        recipes = queryset
+    else:
+        ranked = queryset.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).order_by()
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE ranked.row_number <= %s '
+            f'ORDER BY ranked.row_number',
+            (*params, limit)
+        )
+    grouped = defaultdict(list)
+    for recipe in recipes:
+        grouped[recipe.author_id].append(recipe)
+    return grouped
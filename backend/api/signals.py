@@ -0,0 +1,180 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from recipes.images import release_image
+from recipes.matching import schedule_match_reset
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.search import SEARCH_FIELDS, schedule_ingredient_update
+from recipes.services import (
+    get_recipe_amounts, update_cart_totals_for_recipe
+)
+from users.models import Follow
+from .cache import (
+    feed_head_cache, ingredients_cache, recipe_response_cache, tags_cache
+)
+from .changes import schedule_recipe_removal, schedule_recipe_update
+from .documents import schedule_document_update
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+DOCUMENT_FIELDS = {
+    'author', 'name', 'image', 'thumbnails', 'text', 'cooking_time'
+}
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags_cache(**kwargs):
+    tags_cache.invalidate()
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Tag)
+def reset_match_index(created=False, update_fields=None, **kwargs):
+    if created or (update_fields is not None
+                   and 'slug' not in update_fields):
+        return
+    schedule_match_reset()
+
+
+@receiver(post_save, sender=Tag)
+def rebuild_tag_documents(instance, created, **kwargs):
+    if not created:
+        schedule_document_update(
+            Recipe.objects.filter(tags=instance).values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+def rebuild_untagged_documents(instance, **kwargs):
+    schedule_document_update(
+        list(instance.recipes.values_list('pk', flat=True))
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients_cache(**kwargs):
+    ingredients_cache.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, update_fields, **kwargs):
+    if created or (update_fields is not None
+                   and 'name' not in update_fields):
+        return
+    schedule_ingredient_update(instance.pk)
+    schedule_document_update(Recipe.objects.filter(
+        ingredients=instance
+    ).values_list('pk', flat=True).distinct())
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    recipe_response_cache.invalidate_recipes([instance.pk])
+    if instance.author_id is not None:
+        feed_head_cache.invalidate_author(instance.author_id)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_follower_feed(instance, **kwargs):
+    feed_head_cache.invalidate_users([instance.user_id])
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe(instance, update_fields, **kwargs):
+    fields = None if update_fields is None else set(update_fields)
+    schedule_recipe_update(
+        [instance.pk],
+        search=fields is None or bool(SEARCH_FIELDS & fields),
+        match=fields is None or 'author' in fields,
+        documents=fields is None or bool(DOCUMENT_FIELDS & fields)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(instance, **kwargs):
+    schedule_recipe_removal([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def subtract_recipe_from_carts(instance, **kwargs):
+    # Строки корзин удаляются каскадом без сигналов, поэтому итоги
+    # списков покупок уменьшаются здесь, в той же транзакции, — и при
+    # удалении через API, и из админки.
+    update_cart_totals_for_recipe(
+        instance, get_recipe_amounts([instance]), new_amounts={}
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(instance, **kwargs):
+    name = instance.image.name
+    transaction.on_commit(lambda: release_image(name))
+
+
+@receiver((post_save, post_delete), sender=IngredientAmount)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    # Сигнал приходит на каждую строку, в том числе при каскадном удалении
+    # рецепта; изменения копятся и обрабатываются один раз после коммита,
+    # а удалённые рецепты только убираются из индексов.
+    schedule_recipe_update([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_relations(instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        recipe_response_cache.invalidate_recipes(
+            list(instance.recipes.values_list('pk', flat=True))
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        recipe_response_cache.invalidate_recipes(
+            (pk_set or ()) if reverse else [instance.pk]
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def rematch_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_clear' and reverse:
+        schedule_match_reset()
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_recipe_update(
+            (pk_set or ()) if reverse else [instance.pk],
+            search=False, documents=False
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def rebuild_tagged_documents(instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        schedule_document_update(
+            list(instance.recipes.values_list('pk', flat=True))
+        )
+    elif action in ('post_add', 'post_remove') or (
+        action == 'post_clear' and not reverse
+    ):
+        schedule_recipe_update(
+            (pk_set or ()) if reverse else [instance.pk],
+            search=False, match=False
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, update_fields, **kwargs):
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+    pks = list(instance.recipes.values_list('pk', flat=True))
+    if pks:
+        recipe_response_cache.invalidate_recipes(pks)
+        schedule_document_update(pks)
+
+
+@receiver(pre_delete, sender=User)
+def rebuild_orphaned_documents(instance, **kwargs):
+    pks = list(instance.recipes.values_list('pk', flat=True))
+    if pks:
+        schedule_document_update(pks)
@@ -1,44 +1,91 @@
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import BooleanField, Exists, OuterRef, Value
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Count, Exists, F, OuterRef, Prefetch, Value
+)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.permissions import (
+    SAFE_METHODS, AllowAny, IsAdminUser, IsAuthenticated
+)
 from rest_framework.response import Response
 
 from users.models import Follow
 from recipes.models import (
-    Cart, Favorite, Ingredient, Recipe, Tag
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag
+)
+from recipes.images import (
+    ImageProcessingError, has_image_signature, validate_image
+)
+from recipes.services import (
+    ABSENT, ADDED, EXISTS, REMOVED, change_user_recipes
+)
+from recipes.uploads import stage_upload
+from .autocomplete import ingredient_autocomplete
+from .cache import (
+    feed_head_cache, ingredients_cache, recipe_response_cache, tags_cache
+)
+from .changes import schedule_recipe_update
+from .documents import RecipeDocumentSerializer
+from .filters import POPULAR_ORDERING, IngredientSearchFilter, RecipeFilter
+from .mixins import AnonymousCacheMixin, ReferenceCacheMixin
+from .pagination import LimitCursorPagination, LimitPageNumberPagination
+from .parsers import (
+    IMAGE_FIELD, ImageMultiPartParser, OctetStreamImageParser, RawImageParser
 )
-from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
+from .renderers import SHOPPING_CART_RENDERERS
 from .permissions import IsAdminOrReadOnly, IsAdminUserOrReadOnly
 from .serializers import (
-    FollowSerializer, IngredientSerializer, RecipeReadSerializer,
+    FollowSerializer, IngredientSerializer, RecipeBatchSerializer,
     RecipeWriteSerializer, TagSerializer, ShortRecipeSerializer
 )
-from .services import get_list_ingridients
+from .services import get_list_ingridients, get_recipes_by_author
 
 
 User = get_user_model()
 
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+COUNTERS_MAX_IDS = 100
+CONTAINER_NAMES = {
+    Favorite: 'избранном',
+    Cart: 'списке покупок',
+}
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagsViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    reference_cache = tags_cache
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('^name',)
+    reference_cache = ingredients_cache
+
+    def filter_items(self, items):
+        query = self.request.query_params.get(
+            IngredientSearchFilter.search_param
+        )
+        if query is None:
+            return items
+        limit = self.request.query_params.get('limit', '')
+        limit = int(limit) if limit.isdigit() else 0
+        limit = min(
+            limit or INGREDIENT_SEARCH_LIMIT, INGREDIENT_SEARCH_MAX_LIMIT
+        )
+        return ingredient_autocomplete.search(query, limit)
 
 
 class FollowViewSet(UserViewSet):
@@ -64,28 +111,70 @@ class FollowViewSet(UserViewSet):
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author'
+        ).annotate(
+            recipes_count=Count('author__recipes'),
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('-id')
         pages = self.paginate_queryset(queryset)
+        limit = request.query_params.get('recipes_limit')
+        recipes = get_recipes_by_author(
+            [follow.author_id for follow in pages],
+            int(limit) if limit else None
+        )
         serializer = FollowSerializer(
             pages, many=True,
-            context={'request': request}
+            context={'request': request, 'recipes': recipes}
         )
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    pagination_class = LimitPageNumberPagination
-    filter_class = RecipeFilter
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
+    filterset_class = RecipeFilter
+    response_cache = recipe_response_cache
     permission_classes = (IsAdminUserOrReadOnly,)
 
+    @property
+    def pagination_class(self):
+        # Курсор строится по (pub_date, id) и не подходит для сортировки
+        # по популярности, релевантности или совпадению ингредиентов,
+        # поэтому такие выдачи всегда выводятся по страницам.
+        query_params = self.request.query_params
+        if self.action == 'feed':
+            return LimitCursorPagination
+        if (LimitCursorPagination.cursor_query_param in query_params
+                and query_params.get('ordering') != POPULAR_ORDERING
+                and not query_params.get('search')
+                and not query_params.get('have')):
+            return LimitCursorPagination
+        return LimitPageNumberPagination
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
-            return RecipeReadSerializer
+            return RecipeDocumentSerializer
         return RecipeWriteSerializer
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Recipe.objects.all()
+        if self.request.method in SAFE_METHODS:
+            # Ответ собирается из готовых документов рецептов, поэтому
+            # связанные таблицы и остальные поля не загружаются.
+            queryset = Recipe.objects.only('id', 'pub_date').annotate(
+                document_data=F('document__data')
+            )
+        else:
+            queryset = Recipe.objects.select_related(
+                'author'
+            ).prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.all()),
+                Prefetch(
+                    'ingredient',
+                    queryset=IngredientAmount.objects.select_related(
+                        'ingredients'
+                    ).order_by('ingredients__name')
+                )
+            )
 
         if user.is_authenticated:
             queryset = queryset.annotate(
@@ -98,15 +187,49 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     Cart.objects.filter(
                         user=user, recipe__pk=OuterRef('pk')
                     )
+                ),
+                is_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=user, author__pk=OuterRef('author')
+                    )
                 )
             )
         else:
             queryset = queryset.annotate(
                 is_favorited=Value(False, output_field=BooleanField()),
-                is_in_shopping_cart=Value(False, output_field=BooleanField())
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_subscribed=Value(False, output_field=BooleanField())
             )
         return queryset
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        Первая страница кэшируется для каждого пользователя, остальные
+        выбираются по курсору (pub_date, id).
+        """
+        is_head = not request.query_params.get(
+            LimitCursorPagination.cursor_query_param
+        )
+        cache_key = None
+        if is_head and feed_head_cache.timeout:
+            cache_key = feed_head_cache.get_key(request)
+            data = feed_head_cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author__in=Follow.objects.filter(user=request.user).values(
+                'author'
+            )
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if cache_key is not None:
+            feed_head_cache.set(cache_key, response.data)
+        return response
+
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
@@ -125,26 +248,128 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def del_from_shopping_cart(self, request, pk=None):
         return self.__delete_obj(Cart, request.user, pk)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Правка может не затронуть строку рецепта и не вызвать сигналов,
+        # поэтому кэш сбрасываем явно.
+        serializer.save()
+        feed_head_cache.invalidate_author(serializer.instance.author_id)
+        schedule_recipe_update([serializer.instance.pk])
+
     @staticmethod
     def __add_obj(model, user, pk):
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        results = change_user_recipes(model, user, add=[recipe.pk])
+        if results[recipe.pk] == EXISTS:
+            return Response(
+                {'errors': f'Рецепт уже есть в {CONTAINER_NAMES[model]}.'},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        feed_head_cache.invalidate_users([user.pk])
         serializer = ShortRecipeSerializer(recipe)
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
     @staticmethod
     def __delete_obj(model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
-            return Response(status=HTTPStatus.NO_CONTENT)
+        recipe = get_object_or_404(Recipe, id=pk)
+        results = change_user_recipes(model, user, remove=[recipe.pk])
+        if results[recipe.pk] == ABSENT:
+            return Response(
+                {'errors': f'Рецепта нет в {CONTAINER_NAMES[model]}.'},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        feed_head_cache.invalidate_users([user.pk])
+        return Response(status=HTTPStatus.NO_CONTENT)
+
+    @staticmethod
+    def __change_batch(model, request):
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = change_user_recipes(
+            model, request.user, **serializer.validated_data
+        )
+        if any(result in (ADDED, REMOVED) for result in results.values()):
+            feed_head_cache.invalidate_users([request.user.pk])
+        return Response({'results': [
+            {'id': pk, 'result': result} for pk, result in results.items()
+        ]})
+
+    @action(detail=False, methods=['post'], url_path='favorite',
+            url_name='favorite-batch', permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.__change_batch(Favorite, request)
+
+    @action(detail=False, methods=['post'], url_path='shopping_cart',
+            url_name='shopping-cart-batch',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.__change_batch(Cart, request)
 
     @action(
-        detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+        detail=False, methods=['get'], permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_CART_RENDERERS)
     def download_shopping_cart(self, request):
         user = request.user
-        shopping_cart = get_list_ingridients(user)
-        filename = 'shopping_cart.txt'
-        response = HttpResponse(shopping_cart, content_type='text/plain')
+        renderer = request.accepted_renderer
+        shopping_cart = renderer.stream(get_list_ingridients(user))
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        filename = f'shopping_cart.{renderer.format}'
+        response = StreamingHttpResponse(
+            shopping_cart, content_type=content_type
+        )
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
+
+    @action(
+        detail=False, methods=['post'], url_path='images',
+        permission_classes=[IsAuthenticated],
+        parser_classes=(
+            ImageMultiPartParser, RawImageParser, OctetStreamImageParser
+        ))
+    def upload_image(self, request):
+        image = request.FILES.get(IMAGE_FIELD)
+        if image is None:
+            return Response(
+                {IMAGE_FIELD: ['Файл не был отправлен.']},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        if not self.__is_valid_image(image):
+            image.close()
+            return Response(
+                {IMAGE_FIELD: ['Загрузите картинку в формате JPEG, PNG, GIF '
+                               'или WebP.']},
+                status=HTTPStatus.BAD_REQUEST
+            )
+        return Response(
+            {
+                IMAGE_FIELD: stage_upload(image, request.user),
+                'expires_in': settings.RECIPE_IMAGE_UPLOAD_TTL,
+            },
+            status=HTTPStatus.CREATED
+        )
+
+    @staticmethod
+    def __is_valid_image(image):
+        if not has_image_signature(image.read(16)):
+            return False
+        try:
+            validate_image(image.temporary_file_path())
+        except ImageProcessingError:
+            return False
+        return True
+
+    @action(detail=False, permission_classes=[AllowAny])
+    def counters(self, request):
+        ids = [
+            int(pk) for pk in request.query_params.get('ids', '').split(',')
+            if pk.isdigit()
+        ][:COUNTERS_MAX_IDS]
+        return Response(list(Recipe.objects.filter(pk__in=ids).values(
+            'id', 'favorites_count', 'in_carts_count'
+        )))
+
+    @action(detail=False, permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(recipe_response_cache.stats())
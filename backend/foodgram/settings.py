@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 from distutils.util import strtobool
@@ -34,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -77,6 +79,17 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -110,12 +123,85 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_FORMAT = os.getenv('RECIPE_IMAGE_FORMAT', default='WEBP')
+RECIPE_IMAGE_MAX_SIDE = 1600
+RECIPE_IMAGE_SIZES = {
+    'small': 320,
+    'medium': 640,
+    'large': 1280,
+}
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_ASYNC = strtobool(os.getenv('RECIPE_IMAGE_ASYNC', default='True'))
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default='2'))
+RECIPE_IMAGE_GC_GRACE_PERIOD = 60 * 60
+RECIPE_IMAGE_UPLOAD_DIR = os.getenv(
+    'RECIPE_IMAGE_UPLOAD_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram-uploads')
+)
+RECIPE_IMAGE_UPLOAD_TTL = 60 * 60
+
+RECIPE_FEED_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FEED_CACHE_TIMEOUT', default='60')
+)
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+SERVER_TIMING = strtobool(os.getenv('SERVER_TIMING', default='True'))
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+# Сколько SQL-запросов может сделать эндпоинт, включая работу после
+# коммита и чтение потокового ответа. Превышение в работе только пишется
+# в лог и метрики; бюджеты проверяет tests/test_query_budgets.py на
+# запросах с настоящими коммитами. Обработка картинки идёт в фоне
+# и проверяется по своему бюджету, process_recipe_image.
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 10,
+    'RecipeViewSet.retrieve': 6,
+    'RecipeViewSet.feed': 6,
+    'RecipeViewSet.create': 33,
+    'RecipeViewSet.update': 45,
+    'RecipeViewSet.partial_update': 45,
+    'RecipeViewSet.destroy': 26,
+    'RecipeViewSet.favorite': 12,
+    'RecipeViewSet.del_from_favorite': 12,
+    'RecipeViewSet.shopping_cart': 18,
+    'RecipeViewSet.del_from_shopping_cart': 18,
+    'RecipeViewSet.favorite_batch': 14,
+    'RecipeViewSet.shopping_cart_batch': 18,
+    'RecipeViewSet.download_shopping_cart': 3,
+    'RecipeViewSet.counters': 3,
+    'FollowViewSet.list': 6,
+    'FollowViewSet.retrieve': 4,
+    'FollowViewSet.me': 4,
+    'FollowViewSet.subscribe': 8,
+    'FollowViewSet.unsubscribe': 6,
+    'FollowViewSet.subscriptions': 6,
+    'TagsViewSet.list': 3,
+    'IngredientsViewSet.list': 3,
+    'process_recipe_image': 15,
+}
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    # Browsable API нужен только при разработке: в продакшене ответы
+    # всегда компактный JSON.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
     ),
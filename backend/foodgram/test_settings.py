@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# Без DB_ENGINE тесты идут на SQLite; для проверок планов PostgreSQL
+# базу задают теми же переменными окружения, что и в settings.py.
+if not DATABASES['default']['ENGINE']:
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(tempfile.gettempdir(), 'foodgram-test.sqlite3'),
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'foodgram-test-media')
+RECIPE_IMAGE_UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'uploads')
+RECIPE_IMAGE_ASYNC = False
@@ -1,6 +1,45 @@
 from django.contrib.admin import ModelAdmin, register
 
-from .models import Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag
+from .models import (
+    Cart, CartIngredient, Favorite, Ingredient, IngredientAmount, Recipe, Tag
+)
+from .services import rebuild_cart_totals
+
+
+class CartTotalsAdminMixin:
+    """Пересчитывает итоги списков покупок после правок в админке.
+
+    Админка меняет строки в обход ``recipes.services``, поэтому итоги
+    затронутых пользователей собираются заново.
+    """
+
+    def get_cart_user_ids(self, queryset):
+        raise NotImplementedError
+
+    def get_object_user_ids(self, obj):
+        return set(self.get_cart_user_ids(
+            type(obj).objects.filter(pk=obj.pk)
+        ))
+
+    @staticmethod
+    def rebuild(user_ids):
+        if user_ids:
+            rebuild_cart_totals(list(user_ids))
+
+    def save_model(self, request, obj, form, change):
+        user_ids = self.get_object_user_ids(obj) if change else set()
+        super().save_model(request, obj, form, change)
+        self.rebuild(user_ids | self.get_object_user_ids(obj))
+
+    def delete_model(self, request, obj):
+        user_ids = self.get_object_user_ids(obj)
+        super().delete_model(request, obj)
+        self.rebuild(user_ids)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(self.get_cart_user_ids(queryset))
+        super().delete_queryset(request, queryset)
+        self.rebuild(user_ids)
 
 
 @register(Tag)
@@ -16,19 +55,17 @@ class IngredientAdmin(ModelAdmin):
 
 @register(Recipe)
 class RecipeAdmin(ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
     list_filter = ('author', 'name', 'tags')
-    readonly_fields = ('count_favorites',)
-
-    def count_favorites(self, obj):
-        return obj.favorites.count()
-
-    count_favorites.short_description = 'Число добавлений в избранное'
+    readonly_fields = ('favorites_count', 'in_carts_count')
 
 
 @register(IngredientAmount)
-class IngredientAmountAdmin(ModelAdmin):
-    pass
+class IngredientAmountAdmin(CartTotalsAdminMixin, ModelAdmin):
+    def get_cart_user_ids(self, queryset):
+        return Cart.objects.filter(
+            recipe__in=queryset.values('recipe')
+        ).values_list('user_id', flat=True)
 
 
 @register(Favorite)
@@ -37,5 +74,11 @@ class FavoriteAdmin(ModelAdmin):
 
 
 @register(Cart)
-class CartAdmin(ModelAdmin):
-    pass
+class CartAdmin(CartTotalsAdminMixin, ModelAdmin):
+    def get_cart_user_ids(self, queryset):
+        return queryset.values_list('user_id', flat=True)
+
+
+@register(CartIngredient)
+class CartIngredientAdmin(ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
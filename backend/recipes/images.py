@@ -0,0 +1,228 @@
+import base64
+import binascii
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Recipe
+from .uploads import discard_upload
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIRECTORY = 'recipe_images'
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a',
+                    b'GIF89a', b'RIFF')
+FORMAT_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+ENCODE_OPTIONS = {
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def has_image_signature(header):
+    """Проверяет по первым байтам, что данные похожи на картинку."""
+    if header.startswith(b'RIFF'):
+        return header[8:12] == b'WEBP'
+    return header.startswith(IMAGE_SIGNATURES)
+
+
+def decode_base64(payload):
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError) as error:
+        raise ImageProcessingError(f'Некорректный base64: {error}')
+
+
+def read_image(source):
+    """Открывает и декодирует картинку из байтов или из файла по пути."""
+    def load():
+        return Image.open(
+            BytesIO(source) if isinstance(source, bytes) else source
+        )
+
+    try:
+        with load() as image:
+            image.verify()
+        image = load()
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError,
+            SyntaxError) as error:
+        raise ImageProcessingError(f'Не удалось прочитать картинку: {error}')
+    return image
+
+
+def validate_image(source):
+    """Проверяет, что картинка декодируется, не перекодируя её.
+
+    Вызывается в потоке запроса, чтобы битая картинка давала ответ 400,
+    а не рецепт, у которого картинка так и не появится.
+    """
+    read_image(source).close()
+
+
+def open_image(source):
+    """Открывает картинку и приводит её к RGB или RGBA."""
+    image = ImageOps.exif_transpose(read_image(source))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def encode_image(image, max_side, image_format):
+    """Уменьшает картинку до ``max_side`` и кодирует её без метаданных."""
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **ENCODE_OPTIONS.get(image_format, {}))
+    return buffer.getvalue()
+
+
+def render_variants(source):
+    """Возвращает {размер: байты} основной картинки и миниатюр."""
+    image_format = settings.RECIPE_IMAGE_FORMAT
+    image = open_image(source)
+    variants = {'original': encode_image(
+        image, settings.RECIPE_IMAGE_MAX_SIDE, image_format
+    )}
+    for size, max_side in settings.RECIPE_IMAGE_SIZES.items():
+        variants[size] = encode_image(image, max_side, image_format)
+    return variants
+
+
+def get_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def save_variants(variants):
+    """Сохраняет варианты в хранилище и возвращает их имена.
+
+    Имя основной картинки — хэш содержимого, миниатюры лежат рядом
+    с тем же именем и суффиксом размера.
+    """
+    storage = get_storage()
+    extension = FORMAT_EXTENSIONS[settings.RECIPE_IMAGE_FORMAT]
+    variants = dict(variants)
+    name = storage.save(
+        f'{IMAGE_DIRECTORY}/image.{extension}',
+        ContentFile(variants.pop('original'))
+    )
+    names = {'original': name}
+    for size, content in variants.items():
+        names[size] = storage.save_variant(name, size, ContentFile(content))
+    return names
+
+
+def count_references(names):
+    """Возвращает {имя файла: число рецептов, которые на него ссылаются}."""
+    counts = dict.fromkeys(names, 0)
+    counts.update(
+        Recipe.objects.filter(image__in=counts).values('image').annotate(
+            total=Count('pk')
+        ).values_list('image', 'total')
+    )
+    return counts
+
+
+def is_expired(storage, name, grace_period):
+    try:
+        modified = os.path.getmtime(storage.path(name))
+    except FileNotFoundError:
+        return False
+    return modified < time.time() - grace_period
+
+
+def release_image(name):
+    """Удаляет картинку с миниатюрами, если на неё больше никто не ссылается.
+
+    Недавно сохранённые файлы не трогаем: на них может ссылаться ещё
+    не завершённая загрузка. Их позже уберёт команда media_gc.
+    """
+    if not name or count_references([name])[name]:
+        return
+    storage = get_storage()
+    if is_expired(storage, name, settings.RECIPE_IMAGE_GC_GRACE_PERIOD):
+        storage.delete_with_variants(name, settings.RECIPE_IMAGE_SIZES)
+
+
+def process_recipe_image(recipe_id, payload):
+    """Декодирует, очищает и сохраняет картинку рецепта с миниатюрами.
+
+    ``payload`` — строка base64 или путь к файлу, загруженному через
+    ``recipes.uploads``; такой файл после обработки удаляется.
+    """
+    try:
+        if isinstance(payload, Path):
+            try:
+                variants = render_variants(payload)
+            finally:
+                discard_upload(payload)
+        else:
+            variants = render_variants(decode_base64(payload))
+        names = save_variants(variants)
+        # Документ и версии рецепта обновятся одним набором после коммита.
+        with transaction.atomic():
+            recipe = Recipe.objects.filter(pk=recipe_id).first()
+            if recipe is None:
+                return
+            old_name = recipe.image.name
+            recipe.image.name = names.pop('original')
+            recipe.thumbnails = names
+            recipe.save(update_fields=('image', 'thumbnails'))
+        if old_name != recipe.image.name:
+            release_image(old_name)
+    except ImageProcessingError:
+        logger.warning('Картинка рецепта %s отклонена', recipe_id,
+                       exc_info=True)
+    except Exception:
+        logger.exception('Не удалось обработать картинку рецепта %s',
+                         recipe_id)
+
+
+def run_in_worker(func, *args):
+    try:
+        func(*args)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def schedule_recipe_image(recipe_id, payload):
+    """Ставит обработку картинки в очередь после коммита транзакции."""
+    def submit():
+        if settings.RECIPE_IMAGE_ASYNC:
+            get_executor().submit(
+                run_in_worker, process_recipe_image, recipe_id, payload
+            )
+        else:
+            process_recipe_image(recipe_id, payload)
+
+    transaction.on_commit(submit)
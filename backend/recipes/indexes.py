@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+from threading import Lock
+
+from django.db import transaction
+from django.db.models import Case, FloatField, Value, When
+
+from .models import IndexChange
+from .versions import bump_versions, get_versions
+
+# Изменения, которые процесс готов догнать по одному рецепту; при большем
+# отставании или крупной правке индекс дешевле перестроить целиком.
+MAX_PENDING_CHANGES = 1000
+MAX_CHANGE_SIZE = 10000
+# Как часто удалять записи об изменениях старше MAX_PENDING_CHANGES версий.
+CHANGES_CLEANUP_INTERVAL = 100
+
+
+def order_by_rank(queryset, ranks, alias):
+    """Оставляет рецепты из {id: оценка} и сортирует их по оценке."""
+    return queryset.filter(pk__in=ranks).annotate(**{alias: Case(
+        *(When(pk=pk, then=Value(rank)) for pk, rank in ranks.items()),
+        default=Value(0.0), output_field=FloatField()
+    )}).order_by(f'-{alias}', '-pub_date', '-id')
+
+
+class LocalRecipeIndex:
+    """Индекс рецептов в памяти процесса.
+
+    Строится целиком при первом обращении и дальше обновляется по
+    отдельным рецептам. Каждое изменение увеличивает версию индекса
+    в таблице ``Version`` и записывает в ``IndexChange`` id изменённых
+    рецептов, так что
+    остальные процессы перечитывают только их. Если записей не хватает
+    или их слишком много, копия перестраивается целиком.
+    Наследники определяют ``version_key``, ``clear``, ``load``,
+    ``add`` и ``discard``.
+    """
+    version_key = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+
+    def clear(self):
+        raise NotImplementedError
+
+    def load(self, recipe_ids=None):
+        """Возвращает пары (id рецепта, данные для ``add``)."""
+        raise NotImplementedError
+
+    def add(self, recipe_id, document):
+        raise NotImplementedError
+
+    def discard(self, recipe_id):
+        raise NotImplementedError
+
+    def get_version(self):
+        return get_versions([self.version_key])[self.version_key]
+
+    def get_changes(self, version):
+        """id рецептов, изменённых после своей версии, или None."""
+        if self._version is None or not (
+            0 <= version - self._version <= MAX_PENDING_CHANGES
+        ):
+            return None
+        changes = list(IndexChange.objects.filter(
+            index=self.version_key, version__gt=self._version,
+            version__lte=version
+        ).values_list('recipe_ids', flat=True))
+        if len(changes) < version - self._version or None in changes:
+            return None
+        return set().union(*changes)
+
+    def rebuild(self):
+        self.clear()
+        for recipe_id, document in self.load():
+            self.add(recipe_id, document)
+
+    def reload(self, recipe_ids, reindex=True):
+        recipe_ids = list(recipe_ids)
+        for recipe_id in recipe_ids:
+            self.discard(recipe_id)
+        if reindex and recipe_ids:
+            for recipe_id, document in self.load(recipe_ids):
+                self.add(recipe_id, document)
+
+    @contextmanager
+    def fresh(self):
+        """Блокирует индекс на чтение, при необходимости обновив его."""
+        with self._lock:
+            version = self.get_version()
+            if version != self._version:
+                changes = self.get_changes(version)
+                if changes is None:
+                    self.rebuild()
+                else:
+                    self.reload(changes)
+                self._version = version
+            yield
+
+    def publish(self, recipe_ids):
+        """Сообщает другим процессам об изменении; возвращает версию.
+
+        ``None`` вместо списка id заставляет их перестроить индекс.
+        Версия и запись об изменении становятся видны в одном коммите:
+        прочитав новую версию, процесс всегда найдёт и её изменения.
+        """
+        with transaction.atomic():
+            version = bump_versions([self.version_key])[self.version_key]
+            IndexChange.objects.create(
+                index=self.version_key, version=version,
+                recipe_ids=recipe_ids
+            )
+            if version % CHANGES_CLEANUP_INTERVAL == 0:
+                IndexChange.objects.filter(
+                    index=self.version_key,
+                    version__lte=version - MAX_PENDING_CHANGES
+                ).delete()
+        return version
+
+    def change(self, recipe_ids, reindex):
+        """Обновляет свою копию индекса и сообщает об изменении остальным.
+
+        Своя копия догоняет чужие изменения при следующем обращении;
+        если их не было, её версия сразу становится текущей.
+        """
+        recipe_ids = list(recipe_ids)
+        if len(recipe_ids) > MAX_CHANGE_SIZE:
+            self.reset()
+            return
+        with self._lock:
+            version = self.publish(recipe_ids)
+            if self._version is None:
+                return
+            self.reload(recipe_ids, reindex)
+            if version == self._version + 1:
+                self._version = version
+
+    def update(self, recipe_ids):
+        self.change(recipe_ids, reindex=True)
+
+    def remove(self, recipe_ids):
+        self.change(recipe_ids, reindex=False)
+
+    def reset(self):
+        """Заставляет все процессы перестроить индекс с нуля."""
+        with self._lock:
+            self.publish(None)
+            self._version = None
+            self.clear()
@@ -0,0 +1,361 @@
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.autocomplete import MIN_TYPO_QUERY_LENGTH, AutocompleteIndex
+from api.cache import ingredients_cache
+from api.metrics import RequestStats
+from api.renderers import FastJSONRenderer, orjson
+from recipes.models import Cart, Ingredient, Recipe, Tag, User
+from api.views import INGREDIENT_SEARCH_LIMIT
+from users.models import Follow
+
+WRITE_INGREDIENTS = 150
+RENDER_PAGE_SIZES = (6, 100)
+GIF = (
+    'data:image/gif;base64,'
+    'R0lGODlhAQABAIAAAP///wAAACH5BAEAAAAALAAAAAABAAEAAAICRAEAOw=='
+)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу в отсортированном списке."""
+    rank = -(-len(values) * percent // 100)
+    return values[max(rank - 1, 0)]
+
+
+class Scenarios:
+    """Запросы к основным эндпоинтам.
+
+    Каждый сценарий возвращает (метод, адрес, тело запроса).
+    """
+
+    def __init__(self, rng):
+        self.random = rng
+        self.recipe_ids = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)[:1000]
+        )
+        self.prefixes = list({
+            name[:2] for name in Ingredient.objects.order_by(
+                'pk'
+            ).values_list('name', flat=True)[:1000]
+        })
+        self.prefixes.sort()
+        if not self.recipe_ids or not self.prefixes:
+            raise CommandError(
+                'В базе нет рецептов или ингредиентов: '
+                'сначала выполните generate_data'
+            )
+        self.tag_id = Tag.objects.values_list('pk', flat=True).first()
+        self.ingredient_ids = list(Ingredient.objects.order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:WRITE_INGREDIENTS])
+
+    def recipe_list(self):
+        return 'get', '/api/recipes/?limit=6', None
+
+    def recipe_detail(self):
+        recipe_id = self.random.choice(self.recipe_ids)
+        return 'get', f'/api/recipes/{recipe_id}/', None
+
+    def feed(self):
+        return 'get', '/api/recipes/feed/?limit=6', None
+
+    def subscriptions(self):
+        return 'get', '/api/users/subscriptions/?recipes_limit=3', None
+
+    def download_shopping_cart(self):
+        return 'get', '/api/recipes/download_shopping_cart/', None
+
+    def ingredient_search(self):
+        prefix = self.random.choice(self.prefixes)
+        return 'get', f'/api/ingredients/?name={prefix}', None
+
+    def get_recipe_body(self):
+        return {
+            'name': 'Проверка', 'text': 'Проверка', 'cooking_time': 10,
+            'tags': [self.tag_id], 'image': GIF, 'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in self.ingredient_ids
+            ],
+        }
+
+    def recipe_validation(self):
+        """Рецепт с 150 ингредиентами, один из которых не существует."""
+        body = self.get_recipe_body()
+        body['ingredients'][-1] = {'id': 0, 'amount': 10}
+        return 'post', '/api/recipes/', body
+
+    def recipe_create(self):
+        """Успешное создание рецепта с 150 ингредиентами.
+
+        Выполняется в транзакции, которая откатывается, поэтому база
+        не растёт, а работа после коммита (картинка, индексы, документ)
+        не выполняется и в замер не входит.
+        """
+        return 'post', '/api/recipes/', self.get_recipe_body()
+
+
+SCENARIOS = (
+    'recipe_list', 'recipe_detail', 'feed', 'subscriptions',
+    'download_shopping_cart', 'ingredient_search', 'recipe_validation',
+    'recipe_create',
+)
+ROLLBACK_SCENARIOS = {'recipe_create'}
+
+
+def get_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), capture_output=True,
+            text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Гоняет основные эндпоинты через тестовый клиент Django и выводит '
+        'в JSON пропускную способность, перцентили времени ответа и число '
+        'SQL-запросов. Результаты разных коммитов можно сравнить --compare'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', nargs='+', choices=SCENARIOS, default=SCENARIOS,
+            dest='scenarios'
+        )
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя; по умолчанию подписчик с самой '
+                 'большой корзиной'
+        )
+        parser.add_argument(
+            '--renderers', action='store_true',
+            help='Ещё сравнить скорость JSON-рендереров на страницах рецептов'
+        )
+        parser.add_argument(
+            '--autocomplete', action='store_true',
+            help='Ещё замерить поиск в индексе автодополнения ингредиентов'
+        )
+        parser.add_argument('--output', help='Файл для результатов')
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения'
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        scenarios = Scenarios(random.Random(options['seed']))
+        results = {}
+        for name in options['scenarios']:
+            scenario = getattr(scenarios, name)
+            rollback = name in ROLLBACK_SCENARIOS
+            for _ in range(options['warmup']):
+                self.request(client, *scenario(), rollback=rollback)
+            results[name] = self.run(
+                client, scenario, options['iterations'], rollback
+            )
+        report = {
+            'revision': get_revision(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'user': user.username,
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'follows': Follow.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'scenarios': results,
+        }
+        if options['renderers']:
+            report['renderers'] = self.run_renderers(
+                client, options['iterations']
+            )
+        if options['autocomplete']:
+            report['autocomplete'] = self.run_autocomplete(
+                random.Random(options['seed']), options['iterations']
+            )
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                report['comparison'] = self.compare(json.load(file), results)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def get_user(username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {username}')
+        user_id = Cart.objects.filter(
+            user__in=Follow.objects.values('user')
+        ).values('user').annotate(recipes=Count('pk')).order_by(
+            '-recipes', 'user'
+        ).values_list('user', flat=True).first()
+        if user_id is None:
+            raise CommandError(
+                'Нет пользователя с подписками и списком покупок: '
+                'сначала выполните generate_data'
+            )
+        return User.objects.get(pk=user_id)
+
+    @staticmethod
+    def send(client, method, url, data):
+        if data is None:
+            response = getattr(client, method)(url)
+        else:
+            response = getattr(client, method)(url, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def request(self, client, method, url, data, rollback=False):
+        if not rollback:
+            return self.send(client, method, url, data)
+        with transaction.atomic():
+            response = self.send(client, method, url, data)
+            transaction.set_rollback(True)
+        return response
+
+    def run(self, client, scenario, iterations, rollback=False):
+        durations = []
+        queries = []
+        statuses = set()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            request = scenario()
+            # Запросы считаются вместе с чтением потокового ответа.
+            stats = RequestStats()
+            request_started = time.perf_counter()
+            with connection.execute_wrapper(stats.execute):
+                response = self.request(client, *request, rollback=rollback)
+            durations.append(time.perf_counter() - request_started)
+            statuses.add(response.status_code)
+            queries.append(stats.queries)
+        elapsed = time.perf_counter() - started
+        durations.sort()
+        return {
+            'requests_per_second': round(iterations / elapsed, 2),
+            'latency_ms': {
+                'mean': round(sum(durations) / iterations * 1000, 3),
+                **{
+                    f'p{percent}': round(
+                        percentile(durations, percent) * 1000, 3
+                    )
+                    for percent in (50, 90, 95, 99)
+                },
+                'max': round(durations[-1] * 1000, 3),
+            },
+            'queries': {'min': min(queries), 'max': max(queries)},
+            'statuses': sorted(statuses),
+        }
+
+    @staticmethod
+    def time_renderer(renderer, data, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            content = renderer.render(data)
+        elapsed = time.perf_counter() - started
+        return round(elapsed / iterations * 1000000, 1), len(content)
+
+    def run_renderers(self, client, iterations):
+        """Время рендеринга страниц списка рецептов, мкс на страницу."""
+        results = {}
+        for size in RENDER_PAGE_SIZES:
+            data = client.get(f'/api/recipes/?limit={size}').data
+            stdlib, size_bytes = self.time_renderer(
+                JSONRenderer(), data, iterations
+            )
+            result = {'bytes': size_bytes, 'stdlib_us': stdlib}
+            if orjson is not None:
+                fast, _ = self.time_renderer(
+                    FastJSONRenderer(), data, iterations
+                )
+                result.update(fast_us=fast, speedup=round(stdlib / fast, 2))
+            results[f'page_{size}'] = result
+        return results
+
+    @staticmethod
+    def run_autocomplete(rng, iterations):
+        """Время поиска в индексе автодополнения без HTTP, мкс на запрос.
+
+        Запросы — начала названий и названия с переставленными первыми
+        буквами, которые находятся только через опечатки.
+        """
+        _, items, _ = ingredients_cache.get()
+        index = AutocompleteIndex(items)
+        names = [
+            name for name in index.names
+            if len(name) >= MIN_TYPO_QUERY_LENGTH
+        ]
+        if not names:
+            raise CommandError(
+                'В базе нет ингредиентов: сначала выполните generate_data'
+            )
+        queries = {
+            'prefix': lambda name: name[:3],
+            'typo': lambda name: name[1] + name[0] + name[2:],
+        }
+        results = {}
+        for kind, get_query in queries.items():
+            durations = []
+            for _ in range(iterations):
+                query = get_query(rng.choice(names))
+                started = time.perf_counter()
+                index.search(query, INGREDIENT_SEARCH_LIMIT)
+                durations.append(time.perf_counter() - started)
+            durations.sort()
+            results[kind] = {
+                f'p{percent}_us': round(
+                    percentile(durations, percent) * 1000000, 1
+                )
+                for percent in (50, 99)
+            }
+        return results
+
+    @staticmethod
+    def compare(baseline, results):
+        """Отношение p50 и пропускной способности к прошлому запуску."""
+        comparison = {}
+        for name, result in results.items():
+            old = baseline.get('scenarios', {}).get(name)
+            if old is None:
+                continue
+            comparison[name] = {
+                'p50_ratio': round(
+                    result['latency_ms']['p50'] / old['latency_ms']['p50'], 3
+                ),
+                'throughput_ratio': round(
+                    result['requests_per_second']
+                    / old['requests_per_second'], 3
+                ),
+                'queries_delta': (
+                    result['queries']['max'] - old['queries']['max']
+                ),
+            }
+        return comparison
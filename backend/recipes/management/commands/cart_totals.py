@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import (
+    get_live_cart_totals, get_stored_cart_totals, rebuild_cart_totals
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает или сверяет итоги списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить таблицу с корзинами, ничего не меняя'
+        )
+        parser.add_argument(
+            '--user', type=int, nargs='+', dest='user_ids',
+            help='Ограничиться указанными пользователями'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if not options['verify']:
+            count = rebuild_cart_totals(user_ids)
+            self.stdout.write(
+                self.style.SUCCESS(f'Итоги пересобраны, строк: {count}')
+            )
+            return
+        live = get_live_cart_totals(user_ids)
+        stored = get_stored_cart_totals(user_ids)
+        mismatched = sorted(
+            user_id for user_id in {*live, *stored}
+            if live.get(user_id) != stored.get(user_id)
+        )
+        if mismatched:
+            raise CommandError(
+                'Итоги расходятся у пользователей: '
+                + ', '.join(map(str, mismatched))
+            )
+        self.stdout.write(self.style.SUCCESS('Итоги совпадают с корзинами'))
@@ -0,0 +1,184 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from faker import Faker
+
+from recipes.models import (
+    Cart, Favorite, Ingredient, IngredientAmount, Recipe, Tag, User
+)
+from recipes.services import (
+    rebuild_cart_totals, reconcile_popularity_counters
+)
+from users.models import Follow
+
+RecipeTag = Recipe.tags.through
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+DEFAULT_PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, подписками, '
+        'рецептами, избранным и списками покупок для нагрузочных тестов. '
+        'При одинаковом --seed данные получаются одинаковыми'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--authors', type=int, default=100,
+            help='Сколько из пользователей публикуют рецепты'
+        )
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8
+        )
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок у каждого пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном у каждого пользователя'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Рецептов в списке покупок у каждого пользователя'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён создаваемых пользователей'
+        )
+        parser.add_argument(
+            '--password', default=DEFAULT_PASSWORD,
+            help='Пароль всех создаваемых пользователей'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сначала удалить данные, созданные с тем же --prefix'
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options['authors'] <= options['users']:
+            raise CommandError('--authors должно быть от 1 до --users')
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = f'{options["prefix"]}_'
+        with transaction.atomic():
+            users = User.objects.filter(username__startswith=prefix)
+            if options['clear']:
+                Recipe.objects.filter(author__in=users).delete()
+                users.delete()
+            elif users.exists():
+                raise CommandError(
+                    f'Пользователи с префиксом {prefix} уже есть: '
+                    'передайте --clear или другой --prefix'
+                )
+            ingredient_ids = list(
+                Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+            )
+            if not ingredient_ids:
+                raise CommandError(
+                    'Нет ингредиентов: сначала выполните ingridients_import'
+                )
+            tag_ids = self.get_tag_ids()
+            user_ids = self.create_users(prefix, options)
+            author_ids = user_ids[:options['authors']]
+            recipe_ids = self.create_recipes(author_ids, options['recipes'])
+            self.create_rows(IngredientAmount, (
+                IngredientAmount(
+                    recipe_id=recipe_id, ingredients_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.sample(
+                    ingredient_ids, options['ingredients_per_recipe']
+                )
+            ))
+            self.create_rows(RecipeTag, (
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.sample(
+                    tag_ids, options['tags_per_recipe']
+                )
+            ))
+            self.create_rows(Follow, (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id in user_ids
+                for author_id in self.sample(author_ids, options['follows'])
+                if author_id != user_id
+            ))
+            for model, count in ((Favorite, options['favorites']),
+                                 (Cart, options['cart'])):
+                self.create_rows(model, (
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in user_ids
+                    for recipe_id in self.sample(recipe_ids, count)
+                ))
+            rebuild_cart_totals(user_ids)
+            reconcile_popularity_counters(fix=True)
+        call_command('search_index', stdout=self.stdout)
+        call_command('recipe_documents', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}'
+        ))
+
+    def sample(self, population, count):
+        return self.random.sample(population, min(count, len(population)))
+
+    def create_rows(self, model, rows):
+        model.objects.bulk_create(
+            rows, batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug, color=color)
+                for name, slug, color in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+
+    def create_users(self, prefix, options):
+        password = make_password(options['password'])
+        users = []
+        for number in range(options['users']):
+            username = f'{prefix}{number}'
+            users.append(User(
+                username=username, email=f'{username}@example.com',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(), password=password
+            ))
+        self.create_rows(User, users)
+        # bulk_create не везде возвращает id, поэтому они перечитываются.
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, author_ids, count):
+        self.create_rows(Recipe, (
+            Recipe(
+                author_id=self.random.choice(author_ids),
+                name=self.fake.sentence(nb_words=3)[:200].rstrip('.'),
+                text=self.fake.paragraph(nb_sentences=5),
+                cooking_time=self.random.randint(5, 180)
+            )
+            for _ in range(count)
+        ))
+        return list(Recipe.objects.filter(
+            author_id__in=author_ids
+        ).order_by('pk').values_list('pk', flat=True))
@@ -1,22 +1,141 @@
 import csv
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import ingredients_cache
 from recipes.models import Ingredient
 
+READ_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,[]'
+
+
+def iter_csv(stream):
+    for row in csv.reader(stream):
+        if not row:
+            continue
+        if len(row) != 2:
+            raise CommandError(f'Ожидалось два столбца, получено: {row}')
+        yield row
+
+
+def iter_json(stream):
+    """Потоково читает JSON-массив объектов или JSON Lines."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    number = 0
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+            position += 1
+        if position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError(
+                        f'Некорректный JSON: {buffer[position:][:100]}'
+                    )
+            else:
+                number += 1
+                try:
+                    row = item['name'], item['measurement_unit']
+                except (KeyError, TypeError):
+                    raise CommandError(
+                        f'Элемент {number}: ожидался объект с полями name '
+                        f'и measurement_unit, получено: {str(item)[:100]}'
+                    )
+                yield row
+                continue
+        elif eof:
+            return
+        chunk = stream.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу или "-" для чтения из stdin'
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат данных; по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Сколько строк вставлять за один запрос'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Выполнить загрузку и откатить транзакцию'
+        )
 
     def handle(self, *args, **options):
-        with open(
-            'data/ingredients.csv', encoding='utf-8'
-        ) as f:
-            reader = csv.reader(f)
-            for row in reader:
-                name, unit = row
-                Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=unit
-                )
-        self.stdout.write(
-            self.style.SUCCESS('База ингредиентов загружена')
+        path = options['path']
+        data_format = options['format'] or (
+            'json' if path.endswith(('.json', '.jsonl')) else 'csv'
         )
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        else:
+            try:
+                stream = open(path, encoding='utf-8', newline='')
+            except OSError as error:
+                raise CommandError(f'Не удалось открыть {path}: {error}')
+        reader = iter_json if data_format == 'json' else iter_csv
+        started = time.monotonic()
+        with stream:
+            total, skipped, created = self.load(
+                reader(stream), options['batch_size'], options['dry_run']
+            )
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {total}, добавлено: {created}, '
+            f'пропущено: {skipped}, {rate:.0f} строк/с'
+            + (' (пробный запуск, изменения отменены)'
+               if options['dry_run'] else '')
+        ))
+
+    def load(self, rows, batch_size, dry_run):
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit'
+        ).max_length
+        total = skipped = 0
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                total += len(chunk)
+                batch = []
+                for name, unit in chunk:
+                    name, unit = str(name).strip(), str(unit).strip()
+                    if (not name or not unit or len(name) > name_length
+                            or len(unit) > unit_length):
+                        skipped += 1
+                        continue
+                    batch.append(
+                        Ingredient(name=name, measurement_unit=unit)
+                    )
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            created = Ingredient.objects.count() - before
+            if dry_run:
+                transaction.set_rollback(True)
+            else:
+                ingredients_cache.invalidate()
+        return total, skipped, created
@@ -0,0 +1,142 @@
+import os
+import posixpath
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.images import IMAGE_DIRECTORY, count_references, get_storage
+from recipes.uploads import remove_expired_uploads
+
+CHECKPOINT_NAME = '.media_gc_checkpoint'
+TEMPORARY_PREFIX = '.tmp-'
+
+
+def iter_files(root, after='', relative=''):
+    """Обходит файлы в порядке возрастания пути, начиная после ``after``."""
+    try:
+        with os.scandir(os.path.join(root, relative)) as entries:
+            entries = sorted(
+                entries,
+                key=lambda entry: entry.name + (
+                    '/' if entry.is_dir(follow_symlinks=False) else ''
+                )
+            )
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        path = posixpath.join(relative, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            if path < after and not after.startswith(f'{path}/'):
+                continue
+            yield from iter_files(root, after, path)
+        elif entry.is_file(follow_symlinks=False) and path > after:
+            yield path, entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT картинки рецептов, на которые не ссылается '
+        'ни один рецепт. Обход идёт порциями и продолжается с места, '
+        'где остановился прошлый запуск'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=10000,
+            help='Сколько файлов просмотреть за один запуск'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов проверять одним запросом'
+        )
+        parser.add_argument(
+            '--grace-period', type=int,
+            default=settings.RECIPE_IMAGE_GC_GRACE_PERIOD,
+            help='Не удалять файлы моложе указанного числа секунд'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Начать обход сначала'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено'
+        )
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        root = storage.path(IMAGE_DIRECTORY)
+        checkpoint_path = storage.path(CHECKPOINT_NAME)
+        after = '' if options['reset'] else self.read_checkpoint(
+            checkpoint_path
+        )
+        deadline = time.time() - options['grace_period']
+        files = islice(iter_files(root, after), options['limit'])
+        scanned = deleted = freed = 0
+        while True:
+            batch = list(islice(files, options['batch_size']))
+            if not batch:
+                break
+            scanned += len(batch)
+            for path, size in self.collect_garbage(
+                storage, batch, deadline, options['dry_run']
+            ):
+                deleted += 1
+                freed += size
+                if options['verbosity'] > 1:
+                    self.stdout.write(path)
+            after = batch[-1][0]
+            if not options['dry_run']:
+                self.write_checkpoint(checkpoint_path, after)
+        finished = scanned < options['limit']
+        if finished and not options['dry_run']:
+            self.write_checkpoint(checkpoint_path, '')
+        expired = 0 if options['dry_run'] else remove_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотрено файлов: {scanned}, удалено: {deleted}, '
+            f'просроченных загрузок: {expired}, '
+            f'освобождено: {freed / 1024 / 1024:.1f} МБ, '
+            + ('обход завершён' if finished else 'обход продолжится с '
+               f'{after}')
+            + (' (пробный запуск)' if options['dry_run'] else '')
+        ))
+
+    @staticmethod
+    def collect_garbage(storage, batch, deadline, dry_run):
+        sources = {
+            path: storage.get_source_name(
+                posixpath.join(IMAGE_DIRECTORY, path),
+                settings.RECIPE_IMAGE_SIZES
+            )
+            for path, _ in batch
+        }
+        references = count_references(set(sources.values()))
+        for path, entry in batch:
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime >= deadline:
+                continue
+            is_temporary = entry.name.startswith(TEMPORARY_PREFIX)
+            if not is_temporary and references[sources[path]]:
+                continue
+            if not dry_run:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+            yield path, stat.st_size
+
+    @staticmethod
+    def read_checkpoint(path):
+        try:
+            with open(path, encoding='utf-8') as checkpoint:
+                return checkpoint.read().strip()
+        except FileNotFoundError:
+            return ''
+
+    @staticmethod
+    def write_checkpoint(path, value):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as checkpoint:
+            checkpoint.write(value)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import reconcile_popularity_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет и чинит счётчики избранного и списков покупок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить счётчики, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        mismatched = reconcile_popularity_counters(fix=not options['verify'])
+        if options['verify'] and mismatched:
+            raise CommandError(
+                'Счётчики расходятся у рецептов: '
+                + ', '.join(map(str, mismatched))
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {len(mismatched)}'
+            if mismatched else 'Счётчики совпадают'
+        ))
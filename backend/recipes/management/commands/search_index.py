@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.matching import match_index
+from recipes.models import Recipe
+from recipes.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс и индекс ингредиентов рецептов'
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        get_backend().update(recipe_ids)
+        match_index.reset()
+        self.stdout.write(self.style.SUCCESS(
+            f'Переиндексировано рецептов: {len(recipe_ids)}'
+        ))
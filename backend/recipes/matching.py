@@ -0,0 +1,138 @@
+import heapq
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .indexes import LocalRecipeIndex, order_by_rank
+from .models import IngredientAmount, Recipe
+
+MATCH_RESULTS_LIMIT = 500
+
+RecipeTag = Recipe.tags.through
+
+
+class IngredientMatchIndex(LocalRecipeIndex):
+    """Обратный индекс {id ингредиента: отсортированные id рецептов}.
+
+    Списки рецептов хранятся в ``array('I')``, по четыре байта на
+    рецепт. Для каждого рецепта помнятся его ингредиенты, автор и теги,
+    чтобы отбирать результаты, не обращаясь к базе.
+    """
+    version_key = 'recipes:matching:version'
+
+    def __init__(self):
+        super().__init__()
+        self._postings = {}
+        self._recipes = {}
+
+    def clear(self):
+        self._postings.clear()
+        self._recipes.clear()
+
+    def load(self, recipe_ids=None):
+        recipes = Recipe.objects.order_by()
+        amounts = IngredientAmount.objects.order_by()
+        tags = RecipeTag.objects.order_by()
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            amounts = amounts.filter(recipe_id__in=recipe_ids)
+            tags = tags.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in amounts.values_list(
+            'recipe_id', 'ingredients_id'
+        ).iterator():
+            ingredients[recipe_id].add(ingredient_id)
+        slugs = defaultdict(set)
+        for recipe_id, slug in tags.values_list(
+            'recipe_id', 'tag__slug'
+        ).iterator():
+            slugs[recipe_id].add(slug)
+        for recipe_id, author_id in recipes.values_list(
+            'pk', 'author_id'
+        ).iterator():
+            yield recipe_id, (
+                tuple(ingredients[recipe_id]), author_id,
+                frozenset(slugs[recipe_id]),
+            )
+
+    def add(self, recipe_id, document):
+        for ingredient_id in document[0]:
+            postings = self._postings.get(ingredient_id)
+            if postings is None:
+                postings = self._postings[ingredient_id] = array('I')
+            insort(postings, recipe_id)
+        self._recipes[recipe_id] = document
+
+    def discard(self, recipe_id):
+        document = self._recipes.pop(recipe_id, None)
+        if document is None:
+            return
+        for ingredient_id in document[0]:
+            postings = self._postings[ingredient_id]
+            del postings[bisect_left(postings, recipe_id)]
+            if not postings:
+                del self._postings[ingredient_id]
+
+    def rank(self, have, authors=None, tags=None, allowed=None):
+        """Возвращает {id рецепта: доля его ингредиентов из ``have``}.
+
+        ``authors`` и ``tags`` сужают выдачу так же, как фильтры списка
+        рецептов: автор из списка, хотя бы один тег из списка.
+        ``allowed`` — запрос с остальными фильтрами: лучшие кандидаты
+        проверяются по нему в базе порциями, пока не наберётся выдача.
+        """
+        with self.fresh():
+            matched = Counter()
+            for ingredient_id in set(have):
+                matched.update(self._postings.get(ingredient_id, ()))
+            ranks = []
+            for recipe_id, count in matched.items():
+                ingredients, author_id, slugs = self._recipes[recipe_id]
+                if authors and author_id not in authors:
+                    continue
+                if tags and slugs.isdisjoint(tags):
+                    continue
+                ranks.append((count / len(ingredients), count, recipe_id))
+        if allowed is None:
+            return {
+                recipe_id: coverage for coverage, _, recipe_id in
+                heapq.nlargest(MATCH_RESULTS_LIMIT, ranks)
+            }
+        ranks.sort(reverse=True)
+        result = {}
+        for start in range(0, len(ranks), MATCH_RESULTS_LIMIT):
+            chunk = ranks[start:start + MATCH_RESULTS_LIMIT]
+            found = set(allowed.order_by().filter(
+                pk__in=[recipe_id for _, _, recipe_id in chunk]
+            ).values_list('pk', flat=True))
+            for coverage, _, recipe_id in chunk:
+                if recipe_id in found:
+                    result[recipe_id] = coverage
+                    if len(result) == MATCH_RESULTS_LIMIT:
+                        return result
+        return result
+
+    def match(self, queryset, have, **kwargs):
+        return order_by_rank(
+            queryset, self.rank(have, **kwargs), 'coverage'
+        )
+
+
+match_index = IngredientMatchIndex()
+
+
+def match_recipes(queryset, have, **kwargs):
+    return match_index.match(queryset, have, **kwargs)
+
+
+def schedule_match_update(recipe_ids):
+    """Обновляет рецепты в индексе после коммита транзакции."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: match_index.update(recipe_ids))
+
+
+def schedule_match_reset():
+    transaction.on_commit(match_index.reset)
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.11 on 2026-10-18 19:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_cart_totals(apps, schema_editor):
+    from recipes.services import rebuild_cart_totals
+
+    rebuild_cart_totals(
+        cart_model=apps.get_model('recipes', 'Cart'),
+        totals_model=apps.get_model('recipes', 'CartIngredient'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0006_alter_recipe_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_ingredient_user'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.11 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    from recipes.services import merge_duplicate_ingredients
+
+    merge_duplicate_ingredients({
+        name: apps.get_model('recipes', name) for name in (
+            'Ingredient', 'IngredientAmount', 'Cart', 'CartIngredient'
+        )
+    })
+    if schema_editor.connection.vendor == 'postgresql':
+        # Иначе отложенные проверки внешних ключей после удаления
+        # дублей не дадут изменить таблицу в этой же транзакции.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_cartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_unit'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            reverse_sql='DROP INDEX recipe_tags_tag_recipe_idx;',
+        ),
+    ]
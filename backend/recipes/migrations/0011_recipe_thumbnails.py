@@ -0,0 +1,18 @@
+# Generated by Django 3.2.11 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_tags_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Миниатюры'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.11 on 2026-10-18 21:05
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='recipe_images/', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.11 on 2026-10-18 22:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Cart = apps.get_model('recipes', 'Cart')
+
+    def count(model):
+        return Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(total=Count('pk')).values('total')
+        ), 0)
+
+    Recipe.objects.update(
+        favorites_count=count(Favorite), in_carts_count=count(Cart)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+    ]
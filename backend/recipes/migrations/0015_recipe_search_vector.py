@@ -0,0 +1,43 @@
+# Generated by Django 3.2.11 on 2026-10-18 23:20
+
+from django.db import migrations
+
+# Колонка и GIN-индекс нужны только PostgreSQL: на других базах поиск
+# работает по обратному индексу в памяти (recipes.search).
+CREATE_SQL = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', coalesce(recipes_recipe.name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(i.name, ' ') FROM recipes_ingredientamount a "
+    "JOIN recipes_ingredient i ON i.id = a.ingredients_id "
+    "WHERE a.recipe_id = recipes_recipe.id), '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(recipes_recipe.text, '')), 'C')",
+)
+DROP_SQL = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+
+def run(statements):
+    def execute(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return execute
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_author_pub_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.11 on 2026-10-18 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('data', models.JSONField(verbose_name='Документ')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлён')),
+            ],
+            options={
+                'verbose_name': 'Документ рецепта',
+                'verbose_name_plural': 'Документы рецептов',
+            },
+        ),
+    ]
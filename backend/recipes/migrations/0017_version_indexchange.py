@@ -0,0 +1,42 @@
+# Generated by Django 3.2.11 on 2026-10-18 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipedocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.CharField(max_length=200, verbose_name='Индекс')),
+                ('version', models.BigIntegerField(verbose_name='Версия')),
+                ('recipe_ids', models.JSONField(null=True, verbose_name='Рецепты')),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса',
+                'verbose_name_plural': 'Изменения индексов',
+            },
+        ),
+        migrations.CreateModel(
+            name='Version',
+            fields=[
+                ('name', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='Ключ')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Изменена')),
+            ],
+            options={
+                'verbose_name': 'Версия',
+                'verbose_name_plural': 'Версии',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='indexchange',
+            constraint=models.UniqueConstraint(fields=('index', 'version'), name='unique_index_change_version'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.core import validators
 from django.db import models
 
+from .storage import recipe_image_storage
+
 User = get_user_model()
 
 
@@ -19,6 +21,10 @@ class Ingredient(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
         ordering = ('name',)
+        constraints = (models.UniqueConstraint(
+            fields=('name', 'measurement_unit',),
+            name='unique_ingredient_unit',
+        ),)
 
     def __str__(self):
         return self.name
@@ -65,6 +71,12 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipe_images/',
+        storage=recipe_image_storage,
+        blank=True,
+    )
+    thumbnails = models.JSONField(
+        verbose_name='Миниатюры',
+        default=dict,
         blank=True,
     )
     text = models.TextField(verbose_name='Описание рецепта')
@@ -88,11 +100,35 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации', auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Число добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Число добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_popular_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -185,3 +221,99 @@ class IngredientAmount(models.Model):
 
     def __str__(self):
         return f'{self.ingredients.name} - {self.amount}'
+
+
+class CartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'ingredient',),
+            name='unique_cart_ingredient_user',
+        ),)
+
+    def __str__(self):
+        return f'{self.user} -> {self.ingredient} - {self.amount}'
+
+
+class RecipeDocument(models.Model):
+    """Готовое JSON-представление рецепта для списка и детальной страницы.
+
+    Не содержит флагов, зависящих от пользователя. Пересобирается после
+    изменения рецепта, его тегов, ингредиентов или автора.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт',
+    )
+    data = models.JSONField(verbose_name='Документ')
+    updated = models.DateTimeField(verbose_name='Обновлён', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class Version(models.Model):
+    """Счётчик изменений, общий для всех процессов.
+
+    По версиям процессы узнают, что их кэши и индексы в памяти устарели.
+    Строки не вытесняются, а увеличиваются одним запросом
+    ``UPDATE ... SET value = value + 1``, см. ``recipes.versions``.
+    """
+    name = models.CharField(
+        verbose_name='Ключ', max_length=200, primary_key=True
+    )
+    value = models.BigIntegerField(verbose_name='Версия', default=0)
+    updated = models.DateTimeField(verbose_name='Изменена', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия'
+        verbose_name_plural = 'Версии'
+
+    def __str__(self):
+        return f'{self.name} = {self.value}'
+
+
+class IndexChange(models.Model):
+    """Рецепты, изменённые в одной версии индекса в памяти.
+
+    ``recipe_ids = None`` означает, что индекс нужно перестроить целиком.
+    """
+    index = models.CharField(verbose_name='Индекс', max_length=200)
+    version = models.BigIntegerField(verbose_name='Версия')
+    recipe_ids = models.JSONField(verbose_name='Рецепты', null=True)
+
+    class Meta:
+        verbose_name = 'Изменение индекса'
+        verbose_name_plural = 'Изменения индексов'
+        constraints = (models.UniqueConstraint(
+            fields=('index', 'version',),
+            name='unique_index_change_version',
+        ),)
+
+    def __str__(self):
+        return f'{self.index}:{self.version}'
@@ -0,0 +1,277 @@
+import heapq
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from .indexes import LocalRecipeIndex, order_by_rank
+from .models import Ingredient, IngredientAmount, Recipe
+
+SEARCH_CONFIG = 'russian'
+SEARCH_RESULTS_LIMIT = 500
+UPDATE_CHUNK_SIZE = 1000
+FIELD_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+SEARCH_FIELDS = {'name', 'text'}
+
+TOKEN_PATTERN = re.compile(r'[0-9a-zа-я]+')
+VOWELS = set('аеиоуыэюя')
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой',
+             'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых',
+             'ую', 'юю', 'ая', 'яя', 'ою', 'ею')
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+        'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+        'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+        'ья', 'я')
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _suffixes(groups):
+    """[(окончание, нужна ли перед ним «а»/«я»)] от длинных к коротким."""
+    if isinstance(groups[0], str):
+        groups = ((), groups)
+    return sorted(
+        [(suffix, True) for suffix in groups[0]]
+        + [(suffix, False) for suffix in groups[1]],
+        key=lambda item: -len(item[0])
+    )
+
+
+PERFECTIVE_GERUND_SUFFIXES = _suffixes(PERFECTIVE_GERUND)
+REFLEXIVE_SUFFIXES = _suffixes(REFLEXIVE)
+ADJECTIVE_SUFFIXES = _suffixes(ADJECTIVE)
+PARTICIPLE_SUFFIXES = _suffixes(PARTICIPLE)
+VERB_SUFFIXES = _suffixes(VERB)
+NOUN_SUFFIXES = _suffixes(NOUN)
+SUPERLATIVE_SUFFIXES = _suffixes(SUPERLATIVE)
+DERIVATIONAL_SUFFIXES = _suffixes(DERIVATIONAL)
+
+
+def _strip(word, start, suffixes):
+    """Отрезает самое длинное окончание, целиком лежащее после ``start``."""
+    for suffix, after_a in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= start:
+            stem = word[:-len(suffix)]
+            if after_a and not (len(stem) > start and stem[-1] in 'ая'):
+                continue
+            return stem
+    return None
+
+
+def _region(word, start):
+    """Начало области после первой пары «гласная, согласная»."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Упрощённый стеммер Snowball для русского языка."""
+    rv = next(
+        (index + 1 for index, char in enumerate(word) if char in VOWELS),
+        len(word)
+    )
+    if rv >= len(word):
+        return word
+    r2 = _region(word, _region(word, 0))
+    stemmed = _strip(word, rv, PERFECTIVE_GERUND_SUFFIXES)
+    if stemmed is None:
+        word = _strip(word, rv, REFLEXIVE_SUFFIXES) or word
+        stemmed = _strip(word, rv, ADJECTIVE_SUFFIXES)
+        if stemmed is not None:
+            stemmed = _strip(stemmed, rv, PARTICIPLE_SUFFIXES) or stemmed
+        else:
+            stemmed = (_strip(word, rv, VERB_SUFFIXES)
+                       or _strip(word, rv, NOUN_SUFFIXES) or word)
+    word = stemmed
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, max(r2, rv), DERIVATIONAL_SUFFIXES) or word
+    superlative = _strip(word, rv, SUPERLATIVE_SUFFIXES)
+    if superlative is not None:
+        word = superlative
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        word = word[:-1]
+    elif superlative is None and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [
+        stem(token) for token in
+        TOKEN_PATTERN.findall((text or '').lower().replace('ё', 'е'))
+    ]
+
+
+def chunked(iterable, size=UPDATE_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class PostgresSearchBackend:
+    """Поиск по колонке ``search_vector`` с GIN-индексом."""
+
+    @staticmethod
+    def get_vector_sql():
+        recipe = Recipe._meta.db_table
+        amount = IngredientAmount._meta.db_table
+        ingredient = Ingredient._meta.db_table
+        return (
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+            f"coalesce({recipe}.name, '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(("
+            f"SELECT string_agg(i.name, ' ') FROM {amount} a "
+            f"JOIN {ingredient} i ON i.id = a.ingredients_id "
+            f"WHERE a.recipe_id = {recipe}.id), '')), 'B') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+            f"coalesce({recipe}.text, '')), 'C')"
+        )
+
+    def update(self, recipe_ids):
+        sql = (
+            f'UPDATE {Recipe._meta.db_table} '
+            f'SET search_vector = {self.get_vector_sql()} '
+            f'WHERE {Recipe._meta.db_table}.id = ANY(%s)'
+        )
+        with connection.cursor() as cursor:
+            for chunk in chunked(recipe_ids):
+                cursor.execute(sql, [chunk])
+
+    def remove(self, recipe_ids):
+        pass
+
+    def search(self, queryset, query):
+        table = Recipe._meta.db_table
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.filter(RawSQL(
+            f'{table}.search_vector @@ {tsquery}', (query,),
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({table}.search_vector, {tsquery})', (query,),
+            output_field=FloatField()
+        )).order_by('-search_rank', '-pub_date', '-id')
+
+
+class PythonSearchBackend(LocalRecipeIndex):
+    """Обратный индекс {основа слова: {id рецепта: вес}} в памяти процесса."""
+    version_key = 'recipes:search:version'
+
+    def __init__(self):
+        super().__init__()
+        self._postings = defaultdict(dict)
+        self._documents = {}
+
+    def clear(self):
+        self._postings.clear()
+        self._documents.clear()
+
+    def load(self, recipe_ids=None):
+        recipes = Recipe.objects.order_by()
+        amounts = IngredientAmount.objects.order_by()
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            amounts = amounts.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, name in amounts.values_list(
+            'recipe_id', 'ingredients__name'
+        ).iterator():
+            ingredients[recipe_id].append(name)
+        for recipe_id, name, text in recipes.values_list(
+            'pk', 'name', 'text'
+        ).iterator():
+            yield recipe_id, {
+                'name': name, 'text': text,
+                'ingredients': ' '.join(ingredients[recipe_id]),
+            }
+
+    def add(self, recipe_id, document):
+        scores = defaultdict(float)
+        for field, text in document.items():
+            counts = defaultdict(int)
+            for term in tokenize(text):
+                counts[term] += 1
+            for term, count in counts.items():
+                scores[term] += FIELD_WEIGHTS[field] * (1 + math.log(count))
+        for term, score in scores.items():
+            self._postings[term][recipe_id] = score
+        self._documents[recipe_id] = tuple(scores)
+
+    def discard(self, recipe_id):
+        for term in self._documents.pop(recipe_id, ()):
+            postings = self._postings[term]
+            postings.pop(recipe_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def find(self, query):
+        """Возвращает {id рецепта: релевантность} для всех слов запроса."""
+        terms = set(tokenize(query))
+        if not terms:
+            return {}
+        with self.fresh():
+            postings = [self._postings.get(term, {}) for term in terms]
+            matches = set(min(postings, key=len)).intersection(*postings)
+            ranks = [
+                (sum(posting[recipe_id] for posting in postings), recipe_id)
+                for recipe_id in matches
+            ]
+        return {
+            recipe_id: rank for rank, recipe_id in
+            heapq.nlargest(SEARCH_RESULTS_LIMIT, ranks)
+        }
+
+    def search(self, queryset, query):
+        return order_by_rank(queryset, self.find(query), 'search_rank')
+
+
+postgres_backend = PostgresSearchBackend()
+python_backend = PythonSearchBackend()
+
+
+def get_backend():
+    """PostgreSQL ищет по tsvector с GIN-индексом, другие базы — в памяти."""
+    if connection.vendor == 'postgresql':
+        return postgres_backend
+    return python_backend
+
+
+def search_recipes(queryset, query):
+    return get_backend().search(queryset, query)
+
+
+def schedule_index_update(recipe_ids):
+    """Переиндексирует рецепты после коммита транзакции."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: get_backend().update(recipe_ids))
+
+
+def schedule_ingredient_update(ingredient_id):
+    """Переиндексирует рецепты, в которых есть ингредиент."""
+    def update():
+        get_backend().update(IngredientAmount.objects.filter(
+            ingredients_id=ingredient_id
+        ).values_list('recipe_id', flat=True).distinct().iterator())
+
+    transaction.on_commit(update)
@@ -0,0 +1,289 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, F, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value,
+    When
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (
+    Cart, CartIngredient, Favorite, Ingredient, IngredientAmount, Recipe, User
+)
+
+USERS_CHUNK_SIZE = 1000
+# Предел PositiveSmallIntegerField для количества ингредиента в рецепте.
+MAX_RECIPE_AMOUNT = 32767
+RECIPES_CHUNK_SIZE = 1000
+POPULARITY_COUNTERS = {
+    Favorite: 'favorites_count',
+    Cart: 'in_carts_count',
+}
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+
+
+def get_recipe_amounts(recipes):
+    """Суммы ингредиентов рецептов: {id ингредиента: количество}."""
+    return dict(IngredientAmount.objects.filter(
+        recipe__in=recipes
+    ).values_list('ingredients_id').annotate(total=Sum('amount')).order_by())
+
+
+def apply_cart_deltas(user_ids, deltas):
+    """Прибавляет ``deltas`` к итогам списков покупок пользователей.
+
+    Строки с нулевым или отрицательным количеством удаляются.
+    """
+    deltas = {
+        ingredient_id: delta for ingredient_id, delta in deltas.items()
+        if delta
+    }
+    if not deltas:
+        return
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    increment = Case(
+        *(When(ingredient_id=ingredient_id, then=Value(delta))
+          for ingredient_id, delta in deltas.items()),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        for start in range(0, len(user_ids), USERS_CHUNK_SIZE):
+            chunk = user_ids[start:start + USERS_CHUNK_SIZE]
+            CartIngredient.objects.bulk_create([
+                CartIngredient(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in chunk
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ], ignore_conflicts=True)
+            totals = CartIngredient.objects.filter(
+                user_id__in=chunk, ingredient_id__in=deltas
+            )
+            totals.update(amount=F('amount') + increment)
+            totals.filter(amount__lte=0).delete()
+
+
+def get_cart_deltas(added, removed):
+    """Изменение итогов списка покупок: {id ингредиента: количество}."""
+    removed = set(removed)
+    deltas = defaultdict(int)
+    for recipe_id, ingredient_id, amount in IngredientAmount.objects.filter(
+        recipe__in=[*added, *removed]
+    ).values_list('recipe_id', 'ingredients_id', 'amount'):
+        deltas[ingredient_id] += -amount if recipe_id in removed else amount
+    return deltas
+
+
+def update_cart_totals_for_recipe(recipe, old_amounts, new_amounts=None):
+    """Переносит изменение ингредиентов рецепта во все списки покупок.
+
+    ``old_amounts`` и ``new_amounts`` — словари {id ингредиента:
+    количество} до и после изменения; без ``new_amounts`` берутся
+    текущие строки рецепта.
+    """
+    if new_amounts is None:
+        new_amounts = get_recipe_amounts([recipe])
+    deltas = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in {*old_amounts, *new_amounts}
+    }
+    user_ids = Cart.objects.filter(recipe=recipe).values_list(
+        'user_id', flat=True
+    )
+    apply_cart_deltas(user_ids, deltas)
+
+
+def get_live_cart_totals(user_ids=None, cart_model=Cart):
+    """Итоги списков покупок, посчитанные заново по корзинам."""
+    carts = cart_model.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    rows = carts.values_list(
+        'user_id', 'recipe__ingredient__ingredients_id'
+    ).annotate(total=Sum('recipe__ingredient__amount')).order_by()
+    totals = defaultdict(dict)
+    for user_id, ingredient_id, total in rows:
+        if ingredient_id is not None:
+            totals[user_id][ingredient_id] = total
+    return totals
+
+
+def get_stored_cart_totals(user_ids=None):
+    rows = CartIngredient.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    totals = defaultdict(dict)
+    for user_id, ingredient_id, amount in rows.values_list(
+        'user_id', 'ingredient_id', 'amount'
+    ):
+        totals[user_id][ingredient_id] = amount
+    return totals
+
+
+def rebuild_cart_totals(user_ids=None, cart_model=Cart,
+                        totals_model=CartIngredient):
+    """Пересобирает таблицу итогов и возвращает число записанных строк.
+
+    Миграции передают исторические модели ``Cart`` и ``CartIngredient``.
+    """
+    totals = get_live_cart_totals(user_ids, cart_model)
+    with transaction.atomic():
+        rows = totals_model.objects.all()
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        rows.delete()
+        created = totals_model.objects.bulk_create((
+            totals_model(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for user_id, amounts in totals.items()
+            for ingredient_id, amount in amounts.items()
+        ), batch_size=USERS_CHUNK_SIZE)
+    return len(created)
+
+
+def merge_ingredients(keep_id, duplicate_ids, models=None):
+    """Переносит рецепты с ингредиентов ``duplicate_ids`` на ``keep_id``.
+
+    Если в рецепте есть оба ингредиента, количества складываются.
+    Дубли удаляются, итоги списков покупок их владельцев пересобираются.
+    Миграции передают исторические модели в ``models``.
+    """
+    models = {
+        'Ingredient': Ingredient, 'IngredientAmount': IngredientAmount,
+        'Cart': Cart, 'CartIngredient': CartIngredient, **(models or {}),
+    }
+    amount_model = models['IngredientAmount']
+    totals_model = models['CartIngredient']
+    with transaction.atomic():
+        user_ids = list(totals_model.objects.filter(
+            ingredient_id__in=duplicate_ids
+        ).values_list('user_id', flat=True).distinct())
+        duplicates = amount_model.objects.filter(
+            ingredients_id__in=duplicate_ids
+        ).order_by('pk')
+        kept = {
+            row.recipe_id: row for row in amount_model.objects.filter(
+                ingredients_id=keep_id,
+                recipe_id__in=duplicates.values('recipe_id')
+            )
+        }
+        for row in duplicates:
+            target = kept.get(row.recipe_id)
+            if target is None:
+                row.ingredients_id = keep_id
+                row.save(update_fields=('ingredients',))
+                kept[row.recipe_id] = row
+            else:
+                target.amount = min(target.amount + row.amount,
+                                    MAX_RECIPE_AMOUNT)
+                target.save(update_fields=('amount',))
+                row.delete()
+        models['Ingredient'].objects.filter(pk__in=duplicate_ids).delete()
+        if user_ids:
+            rebuild_cart_totals(user_ids, models['Cart'], totals_model)
+
+
+def merge_duplicate_ingredients(models=None):
+    """Сливает ингредиенты с одинаковыми названием и единицей.
+
+    Остаётся ингредиент с наименьшим id. Возвращает число слитых групп.
+    """
+    ingredient_model = (models or {}).get('Ingredient', Ingredient)
+    groups = list(ingredient_model.objects.order_by().values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('pk'), total=Count('pk')).filter(total__gt=1))
+    for group in groups:
+        merge_ingredients(group['keep_id'], list(
+            ingredient_model.objects.filter(
+                name=group['name'],
+                measurement_unit=group['measurement_unit']
+            ).exclude(pk=group['keep_id']).values_list('pk', flat=True)
+        ), models)
+    return len(groups)
+
+
+def change_popularity(model, recipe_ids, delta):
+    """Атомарно сдвигает счётчик рецептов для ``Favorite`` или ``Cart``."""
+    field = POPULARITY_COUNTERS[model]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def count_popularity(model):
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe'
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile_popularity_counters(fix=True):
+    """Находит рецепты с разошедшимися счётчиками и, если нужно, чинит.
+
+    Возвращает список id таких рецептов. Исправление пересчитывает
+    значения в самом UPDATE, поэтому не теряет параллельные изменения.
+    """
+    counters = {
+        field: count_popularity(model)
+        for model, field in POPULARITY_COUNTERS.items()
+    }
+    mismatched = list(Recipe.objects.alias(**{
+        f'actual_{field}': counter for field, counter in counters.items()
+    }).filter(Q(*(
+        ~Q(**{field: F(f'actual_{field}')}) for field in counters
+    ), _connector=Q.OR)).order_by('pk').values_list('pk', flat=True))
+    if fix:
+        for start in range(0, len(mismatched), RECIPES_CHUNK_SIZE):
+            Recipe.objects.filter(
+                pk__in=mismatched[start:start + RECIPES_CHUNK_SIZE]
+            ).update(**counters)
+    return mismatched
+
+
+def change_user_recipes(model, user, add=(), remove=()):
+    """Добавляет и удаляет рецепты в избранном или списке покупок.
+
+    Всё выполняется в одной транзакции: одна вставка
+    ``bulk_create(ignore_conflicts=True)`` и один ``DELETE ... IN``.
+    Строка пользователя блокируется, чтобы параллельные запросы
+    не сбили счётчики и итоги списка покупок. Возвращает
+    {id рецепта: результат}.
+    """
+    requested = {*add, *remove}
+    with transaction.atomic():
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        found = set(Recipe.objects.filter(pk__in=requested).values_list(
+            'pk', flat=True
+        ))
+        present = set(model.objects.filter(
+            user=user, recipe_id__in=found
+        ).values_list('recipe_id', flat=True))
+        added = [pk for pk in add if pk in found and pk not in present]
+        removed = [pk for pk in remove if pk in present]
+        if added:
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in added],
+                ignore_conflicts=True
+            )
+            change_popularity(model, added, 1)
+        if removed:
+            model.objects.filter(user=user, recipe_id__in=removed).delete()
+            change_popularity(model, removed, -1)
+        if model is Cart:
+            apply_cart_deltas([user.pk], get_cart_deltas(added, removed))
+    results = {}
+    for pk in add:
+        results[pk] = (NOT_FOUND if pk not in found
+                       else EXISTS if pk in present else ADDED)
+    for pk in remove:
+        results[pk] = (NOT_FOUND if pk not in found
+                       else REMOVED if pk in present else ABSENT)
+    return results
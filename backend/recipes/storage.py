@@ -0,0 +1,93 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+VARIANT_PATTERN = re.compile(r'^(?P<stem>.+)_(?P<variant>[a-z]+)$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по SHA-256 содержимого.
+
+    Одинаковые файлы сохраняются один раз: ``recipe_images/ab/cd/<hash>.webp``.
+    Производные файлы (миниатюры) кладутся рядом под именем
+    ``<hash>_<вариант>.<расширение>`` через ``save_variant``.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    @staticmethod
+    def get_digest(content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = self.get_digest(content)
+        name = posixpath.join(
+            directory, digest[:2], digest[2:4], f'{digest}{extension}'
+        )
+        if self.exists(name):
+            # Освежаем mtime, чтобы сборщик мусора не удалил файл,
+            # на который вот-вот появится ссылка.
+            os.utime(self.path(name))
+        else:
+            self._write(name, content)
+        return name
+
+    def save_variant(self, name, variant, content):
+        """Сохраняет производный файл для ``name`` и возвращает его имя."""
+        stem, extension = os.path.splitext(name)
+        variant_name = f'{stem}_{variant}{extension}'
+        if not self.exists(variant_name):
+            self._write(variant_name, content)
+        return variant_name
+
+    def _write(self, name, content):
+        """Атомарно записывает файл: через временный файл и os.replace."""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=directory, prefix='.tmp-'
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as temporary_file:
+                content.seek(0)
+                for chunk in content.chunks():
+                    temporary_file.write(chunk)
+            os.chmod(temporary_path, self.file_permissions_mode or 0o644)
+            os.replace(temporary_path, full_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    @staticmethod
+    def get_source_name(name, variants):
+        """Имя исходного файла, от которого произведён ``name``."""
+        stem, extension = os.path.splitext(name)
+        match = VARIANT_PATTERN.match(stem)
+        if match and match['variant'] in variants:
+            return f'{match["stem"]}{extension}'
+        return name
+
+    def delete_with_variants(self, name, variants):
+        stem, extension = os.path.splitext(name)
+        for variant_name in (name, *(f'{stem}_{variant}{extension}'
+                                     for variant in variants)):
+            self.delete(variant_name)
+
+
+recipe_image_storage = ContentAddressedStorage()
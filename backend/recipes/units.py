@@ -0,0 +1,42 @@
+from django.db.models import Case, CharField, IntegerField, Value, When
+
+# Единица: (каноническая единица, сколько в ней канонических единиц).
+# Ложки, стаканы и штуки не переводятся: без плотности продукта
+# их нельзя честно сложить с граммами.
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
+# Каноническая единица: (крупная единица, её размер) для вывода.
+DISPLAY_UNITS = {
+    base_unit: (unit, factor)
+    for unit, (base_unit, factor) in UNIT_CONVERSIONS.items()
+}
+
+
+def to_canonical_unit(field):
+    """Выражение, заменяющее единицу из поля ``field`` канонической."""
+    return Case(
+        *(When(**{field: source}, then=Value(base_unit))
+          for source, (base_unit, _) in UNIT_CONVERSIONS.items()),
+        default=field, output_field=CharField()
+    )
+
+
+def to_canonical_factor(field):
+    """Выражение: сколько канонических единиц в единице из ``field``."""
+    return Case(
+        *(When(**{field: source}, then=Value(factor))
+          for source, (_, factor) in UNIT_CONVERSIONS.items()),
+        default=Value(1), output_field=IntegerField()
+    )
+
+
+def humanize_amount(amount, unit):
+    """Переводит 1500 г в 1.5 кг, меньшие количества оставляет как есть."""
+    display_unit, factor = DISPLAY_UNITS.get(unit, (unit, 1))
+    if factor == 1 or amount < factor:
+        return amount, unit
+    value = amount / factor
+    return (int(value) if value.is_integer() else round(value, 3),
+            display_unit)
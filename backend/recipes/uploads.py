@@ -0,0 +1,120 @@
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.move import file_move_safe
+
+TOKEN_PREFIX = 'upload:'
+TOKEN_SALT = 'recipes.uploads'
+CLAIMED_SUFFIX = '.claimed'
+
+
+def get_upload_path(name):
+    return Path(settings.RECIPE_IMAGE_UPLOAD_DIR) / name
+
+
+def stage_upload(uploaded_file, user):
+    """Переносит загруженный файл во временное хранилище.
+
+    Возвращает токен, который можно передать в поле ``image`` рецепта
+    вместо base64. Токен подписан ``SECRET_KEY`` и содержит имя файла,
+    пользователя и размер, поэтому не зависит от кэша и проверяется
+    в любом процессе. Он действует ``RECIPE_IMAGE_UPLOAD_TTL`` секунд
+    и только для загрузившего файл пользователя.
+    """
+    name = secrets.token_urlsafe(24)
+    path = get_upload_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_move_safe(uploaded_file.temporary_file_path(), str(path))
+    uploaded_file.close()
+    token = signing.dumps(
+        {'name': name, 'user': user.pk, 'size': uploaded_file.size},
+        salt=TOKEN_SALT
+    )
+    return f'{TOKEN_PREFIX}{token}'
+
+
+def get_upload(token, user):
+    """Возвращает путь к загруженному файлу или None."""
+    try:
+        upload = signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.RECIPE_IMAGE_UPLOAD_TTL
+        )
+    except signing.BadSignature:
+        return None
+    if upload['user'] != user.pk:
+        return None
+    path = get_upload_path(upload['name'])
+    try:
+        if path.stat().st_size != upload['size']:
+            return None
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def claim_upload(path):
+    """Забирает загрузку, чтобы токен нельзя было использовать повторно.
+
+    Файл переименовывается, а переименование атомарно, поэтому из
+    параллельных запросов с одним токеном его получит только один.
+    Время изменения обновляется, чтобы ``remove_expired_uploads`` не
+    удалил файл до обработки. Возвращает новый путь или None, если
+    файл уже забран.
+    """
+    claimed = path.with_name(f'{path.name}{CLAIMED_SUFFIX}')
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    os.utime(claimed)
+    return claimed
+
+
+@contextmanager
+def claimed_upload(path):
+    """Забирает загрузку на время сохранения рецепта.
+
+    Отдаёт путь к забранному файлу или None, если его уже забрали.
+    Если сохранение упало, файл возвращается на место и токен снова
+    действует.
+    """
+    claimed = claim_upload(path)
+    try:
+        yield claimed
+    except BaseException:
+        if claimed is not None:
+            os.rename(claimed, path)
+        raise
+
+
+def discard_upload(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_expired_uploads():
+    """Удаляет загрузки, токены которых уже истекли.
+
+    Забранные файлы к этому времени обработаны или брошены из-за
+    ошибки при сохранении рецепта, поэтому удаляются и они.
+    """
+    directory = settings.RECIPE_IMAGE_UPLOAD_DIR
+    deadline = time.time() - settings.RECIPE_IMAGE_UPLOAD_TTL
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        if (entry.is_file(follow_symlinks=False)
+                and entry.stat().st_mtime < deadline):
+            discard_upload(entry.path)
+            removed += 1
+    return removed
@@ -0,0 +1,138 @@
+from threading import local
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Version
+
+BUMP_CHUNK_SIZE = 1000
+
+
+def get_versions(names):
+    """{ключ: версия}; у ключей, которые ещё не менялись, версия 0."""
+    names = list(names)
+    versions = dict(Version.objects.filter(
+        name__in=names
+    ).values_list('name', 'value'))
+    return {name: versions.get(name, 0) for name in names}
+
+
+def get_version(name):
+    """(версия, время её изменения); у нового ключа (0, None)."""
+    return Version.objects.filter(name=name).values_list(
+        'value', 'updated'
+    ).first() or (0, None)
+
+
+def upsert(rows_sql, params):
+    table = connection.ops.quote_name(Version._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (name, value, updated) {rows_sql} '
+            f'ON CONFLICT (name) DO UPDATE SET value = {table}.value + 1, '
+            f'updated = EXCLUDED.updated RETURNING name, value',
+            params
+        )
+        return dict(cursor.fetchall())
+
+
+def get_now():
+    return connection.ops.adapt_datetimefield_value(timezone.now())
+
+
+def bump_versions(names):
+    """Увеличивает версии на 1; возвращает {ключ: новая версия}.
+
+    Каждая порция ключей — один запрос ``INSERT ... ON CONFLICT DO
+    UPDATE SET value = value + 1``: база сама упорядочивает одновременные
+    увеличения, и ни одно не теряется. Ключи сортируются, чтобы
+    запросы с общими ключами блокировали строки в одном порядке.
+    """
+    names = sorted(set(names))
+    now = get_now()
+    versions = {}
+    for start in range(0, len(names), BUMP_CHUNK_SIZE):
+        chunk = names[start:start + BUMP_CHUNK_SIZE]
+        versions.update(upsert(
+            'VALUES ' + ', '.join(['(%s, 1, %s)'] * len(chunk)),
+            [param for name in chunk for param in (name, now)]
+        ))
+    return versions
+
+
+def bump_selected_versions(queryset):
+    """Увеличивает версии ключей из ``queryset`` одним запросом.
+
+    ``queryset`` выбирает одну строковую колонку ``name`` без повторов:
+    ключи не загружаются в Python, сколько бы их ни было.
+    """
+    sql, params = queryset.order_by('name').query.sql_with_params()
+    upsert(
+        f'SELECT keys.name, 1, %s FROM ({sql}) keys WHERE true',
+        (get_now(), *params)
+    )
+
+
+class VersionBump:
+    """Ключи версий, которые нужно увеличить после одного коммита."""
+
+    def __init__(self):
+        self.names = set()
+        self.selected = {}
+        self.finished = False
+
+    def __call__(self):
+        self.finished = True
+        bump_versions(self.names)
+        for queryset in self.selected.values():
+            bump_selected_versions(queryset)
+
+
+class PendingVersionBumps:
+    """Копит ключи версий до коммита текущей транзакции.
+
+    Сигналы одной записи сбрасывают кэш рецепта, ленты и автора по
+    отдельности; здесь они сливаются в один запрос после коммита.
+    Вне транзакции версии увеличиваются сразу.
+    """
+
+    def __init__(self):
+        self._local = local()
+
+    def clear(self):
+        self._local.bump = None
+
+    def get_bump(self):
+        bump = getattr(self._local, 'bump', None)
+        if bump is None or bump.finished or not any(
+            callback is bump for _, callback in connection.run_on_commit
+        ):
+            bump = self._local.bump = VersionBump()
+            transaction.on_commit(bump)
+        return bump
+
+    def add(self, names):
+        if connection.in_atomic_block:
+            self.get_bump().names.update(names)
+        else:
+            bump_versions(names)
+
+    def add_selected(self, key, queryset):
+        """Ключи из ``queryset``; выборка с тем же ``key`` в одной
+        транзакции выполняется один раз.
+        """
+        if connection.in_atomic_block:
+            self.get_bump().selected.setdefault(key, queryset)
+        else:
+            bump_selected_versions(queryset)
+
+
+pending_version_bumps = PendingVersionBumps()
+
+
+def bump_versions_on_commit(names):
+    pending_version_bumps.add(names)
+
+
+def bump_selected_versions_on_commit(key, queryset):
+    pending_version_bumps.add_selected(key, queryset)
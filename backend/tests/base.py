@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from api.autocomplete import ingredient_autocomplete
+from api.cache import ingredients_cache, tags_cache
+from api.changes import pending_recipe_changes
+from api.documents import update_documents
+from recipes.matching import match_index
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag, User
+from recipes.search import python_backend
+from recipes.versions import pending_version_bumps
+
+GIF = (
+    'data:image/gif;base64,'
+    'R0lGODlhAQABAIAAAP///wAAACH5BAEAAAAALAAAAAABAAEAAAICRAEAOw=='
+)
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='password-1234', first_name=username, last_name=username
+    )
+
+
+def create_tags(count):
+    return [
+        Tag.objects.get_or_create(
+            slug=f'tag{number}',
+            defaults={'name': f'Тег {number}', 'color': f'#00000{number}'}
+        )[0]
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count, unit='г'):
+    return [
+        Ingredient.objects.get_or_create(
+            name=f'ингредиент {number}', measurement_unit=unit
+        )[0]
+        for number in range(count)
+    ]
+
+
+def create_recipes(author, count, tags=(), ingredients=(), amount=10):
+    """Рецепты с тегами и ингредиентами без запросов через API.
+
+    Сигналы откладывают индексы и документы до коммита, которого
+    в ``TestCase`` нет, поэтому документы строятся сразу.
+    """
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author, name=f'Рецепт {number}', text='Описание',
+            cooking_time=10
+        )
+        recipe.tags.set(tags)
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe, ingredients=ingredient, amount=amount
+            )
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    update_documents([recipe.pk for recipe in recipes])
+    return recipes
+
+
+class FreshStateMixin:
+    """Чистый кэш перед каждым тестом: индексы в памяти строятся заново.
+
+    Версии в ``recipes.Version`` откатываются вместе с тестом и могут
+    повториться, поэтому копии в памяти процесса сбрасываются явно.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        for index in (python_backend, match_index):
+            index._version = None
+        for reference in (tags_cache, ingredients_cache):
+            reference._local = None
+        ingredient_autocomplete._index = (None, None)
+        pending_recipe_changes.clear()
+        pending_version_bumps.clear()
+
+    def read_response(self, method, url, data=None, **kwargs):
+        response = getattr(self.client, method)(url, data, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+
+class BaseAPITestCase(FreshStateMixin, APITestCase):
+    """Тесты API внутри транзакции теста.
+
+    Изменения рецептов из ``setUpTestData`` ждут коммита, которого
+    не будет, поэтому каждый тест копит свои отдельно.
+    """
+
+    def count_queries(self, method, url, data=None, **kwargs):
+        """Выполняет запрос и возвращает (ответ, число SQL-запросов).
+
+        Считаются и запросы при чтении потокового ответа, и колбэки
+        ``on_commit``, выполненные после коммита.
+        """
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.read_response(method, url, data, **kwargs)
+        return response, len(context)
+
+
+class BaseAPITransactionTestCase(FreshStateMixin, APITransactionTestCase):
+    """Тесты API с настоящими коммитами, как в работе.
+
+    Колбэки ``on_commit`` выполняются сразу после коммита запроса,
+    а транзакции не превращаются в точки сохранения, поэтому число
+    запросов совпадает с тем, что видит база в работе.
+    """
+
+    def count_queries(self, method, url, data=None, **kwargs):
+        """Выполняет запрос и возвращает (ответ, число SQL-запросов)."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.read_response(method, url, data, **kwargs)
+        return response, len(context)
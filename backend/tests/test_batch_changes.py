@@ -0,0 +1,95 @@
+from django.urls import reverse
+
+from api.serializers import RecipeBatchSerializer
+from recipes.models import Cart, Favorite
+from recipes.services import ABSENT, ADDED, EXISTS, NOT_FOUND, REMOVED
+from .base import BaseAPITestCase, create_recipes, create_user
+
+ENDPOINTS = (('favorite-batch', Favorite), ('shopping-cart-batch', Cart))
+
+
+class RecipeBatchTest(BaseAPITestCase):
+    """Пакетное добавление и удаление в избранном и списке покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.recipes = create_recipes(create_user('author'), 4)
+        cls.missing = cls.recipes[-1].pk + 100
+        for model in (Favorite, Cart):
+            model.objects.create(user=cls.user, recipe=cls.recipes[0])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def post(self, name, data):
+        return self.client.post(
+            reverse(f'api:recipes-{name}'), data, format='json'
+        )
+
+    def get_results(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {
+            item['id']: item['result'] for item in response.data['results']
+        }
+
+    def test_results_per_id(self):
+        first, second, third, _ = self.recipes
+        for name, model in ENDPOINTS:
+            with self.subTest(name):
+                response = self.post(name, {
+                    'add': [first.pk, second.pk, second.pk, self.missing],
+                    'remove': [third.pk, self.missing + 1],
+                })
+                self.assertEqual(self.get_results(response), {
+                    first.pk: EXISTS,
+                    second.pk: ADDED,
+                    self.missing: NOT_FOUND,
+                    third.pk: ABSENT,
+                    self.missing + 1: NOT_FOUND,
+                })
+                response = self.post(name, {'remove': [first.pk, second.pk]})
+                self.assertEqual(self.get_results(response), {
+                    first.pk: REMOVED, second.pk: REMOVED,
+                })
+                self.assertFalse(
+                    model.objects.filter(user=self.user).exists()
+                )
+
+    def test_add_and_remove_overlap_is_rejected(self):
+        recipe = self.recipes[1]
+        for name, model in ENDPOINTS:
+            with self.subTest(name):
+                response = self.post(name, {
+                    'add': [recipe.pk], 'remove': [recipe.pk],
+                })
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(str(recipe.pk), str(response.data))
+                self.assertFalse(model.objects.filter(
+                    user=self.user, recipe=recipe
+                ).exists())
+
+    def test_empty_request_is_rejected(self):
+        for name, _ in ENDPOINTS:
+            with self.subTest(name):
+                self.assertEqual(self.post(name, {}).status_code, 400)
+
+    def test_size_cap(self):
+        limit = RecipeBatchSerializer.max_length
+        ids = list(range(self.missing, self.missing + limit + 1))
+        for name, _ in ENDPOINTS:
+            with self.subTest(name):
+                for key in ('add', 'remove'):
+                    response = self.post(name, {key: ids})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(key, response.data)
+                    response = self.post(name, {key: ids[:limit]})
+                    self.assertEqual(len(self.get_results(response)), limit)
+
+    def test_anonymous_is_rejected(self):
+        self.client.force_authenticate(None)
+        for name, _ in ENDPOINTS:
+            with self.subTest(name):
+                response = self.post(name, {'add': [self.recipes[1].pk]})
+                self.assertEqual(response.status_code, 401)
@@ -0,0 +1,64 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+from django.urls import reverse
+
+from recipes.models import Cart, CartIngredient, IngredientAmount
+from recipes.services import get_live_cart_totals, get_stored_cart_totals
+from .base import (
+    BaseAPITestCase, create_ingredients, create_recipes, create_user
+)
+
+
+class CartTotalsTest(BaseAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.ingredients = create_ingredients(3)
+        cls.recipes = create_recipes(
+            create_user('author'), 2, ingredients=cls.ingredients
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        for recipe in self.recipes:
+            self.client.post(
+                reverse('api:recipes-shopping-cart', args=[recipe.pk])
+            )
+
+    def assert_totals_match(self):
+        self.assertEqual(
+            get_stored_cart_totals([self.user.pk]),
+            get_live_cart_totals([self.user.pk])
+        )
+
+    def test_migration_fills_existing_carts(self):
+        CartIngredient.objects.all().delete()
+        migration = import_module('recipes.migrations.0007_cartingredient')
+        migration.fill_cart_totals(apps, None)
+        self.assertEqual(
+            dict(get_stored_cart_totals([self.user.pk])[self.user.pk]),
+            {ingredient.pk: 20 for ingredient in self.ingredients}
+        )
+
+    def test_recipe_delete_outside_api(self):
+        self.recipes[0].delete()
+        self.assert_totals_match()
+
+    def test_admin_changes(self):
+        request = RequestFactory().post('/')
+        site._registry[Cart].delete_queryset(
+            request, Cart.objects.filter(recipe=self.recipes[0])
+        )
+        self.assert_totals_match()
+        amount = IngredientAmount.objects.filter(
+            recipe=self.recipes[1]
+        ).first()
+        amount.amount = 100
+        site._registry[IngredientAmount].save_model(
+            request, amount, None, change=True
+        )
+        self.assert_totals_match()
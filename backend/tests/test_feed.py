@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.cache import feed_head_cache
+from recipes.models import Recipe
+from recipes.versions import get_versions
+from users.models import Follow
+from .base import BaseAPITestCase, create_recipes, create_user
+
+
+class FeedHeadCacheTest(BaseAPITestCase):
+    url = reverse('api:recipes-feed')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.other = create_user('other')
+        create_recipes(cls.author, 2)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('api:users-subscribe', args=[self.author.pk])
+            )
+
+    def get_names(self):
+        response, queries = self.count_queries('get', self.url)
+        self.assertEqual(response.status_code, 200)
+        names = [recipe['name'] for recipe in response.data['results']]
+        return names, queries
+
+    def test_head_is_cached_until_author_publishes(self):
+        names, miss_queries = self.get_names()
+        cached_names, hit_queries = self.get_names()
+        self.assertEqual(cached_names, names)
+        self.assertLess(hit_queries, miss_queries)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipes(self.other, 1)
+        self.assertEqual(self.get_names(), (names, hit_queries))
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                author=self.author, name='Новый', text='Описание',
+                cooking_time=5
+            )
+        names, _ = self.get_names()
+        self.assertEqual(names[0], 'Новый')
+
+    def test_author_write_bumps_followers_in_one_query(self):
+        followers = [
+            create_user(f'follower{number}') for number in range(20)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.bulk_create(
+                Follow(user=follower, author=self.author)
+                for follower in followers
+            )
+        keys = [
+            feed_head_cache.version_key(user.pk)
+            for user in (self.user, *followers)
+        ]
+        before = get_versions(keys)
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                Recipe.objects.create(
+                    author=self.author, name='Новый', text='Описание',
+                    cooking_time=5
+                )
+        follow_table = Follow._meta.db_table
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if follow_table in query['sql']
+        ]), 1)
+        self.assertEqual(
+            get_versions(keys), {key: before[key] + 1 for key in keys}
+        )
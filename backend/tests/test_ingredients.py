@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from api.autocomplete import AutocompleteIndex
+from api.views import INGREDIENT_SEARCH_LIMIT, INGREDIENT_SEARCH_MAX_LIMIT
+from recipes.models import CartIngredient, Ingredient, IngredientAmount
+from recipes.services import (
+    get_live_cart_totals, get_stored_cart_totals, merge_ingredients
+)
+from .base import (
+    BaseAPITestCase, create_ingredients, create_recipes, create_user
+)
+
+
+class IngredientImportTest(BaseAPITestCase):
+
+    def run_import(self, content, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        call_command('ingridients_import', path, stdout=io.StringIO())
+
+    def get_ingredients(self):
+        return set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        ))
+
+    def test_csv_skips_duplicates_and_blank_rows(self):
+        self.run_import('мука,г\n\nмука,г\nмолоко,мл\n,г\n', '.csv')
+        self.assertEqual(self.get_ingredients(),
+                         {('мука', 'г'), ('молоко', 'мл')})
+
+    def test_json_array_and_lines(self):
+        self.run_import(json.dumps([
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'name': 'соль', 'measurement_unit': 'г'},
+        ], ensure_ascii=False), '.json')
+        self.run_import(
+            '{"name": "молоко", "measurement_unit": "мл"}\n', '.jsonl'
+        )
+        self.assertEqual(
+            self.get_ingredients(),
+            {('мука', 'г'), ('соль', 'г'), ('молоко', 'мл')}
+        )
+
+    def test_malformed_json_item(self):
+        for item in ({'name': 'соль'}, 'соль', ['соль', 'г']):
+            with self.subTest(item=item):
+                content = json.dumps(
+                    [{'name': 'мука', 'measurement_unit': 'г'}, item],
+                    ensure_ascii=False
+                )
+                with self.assertRaisesMessage(CommandError, 'Элемент 2'):
+                    self.run_import(content, '.json')
+                self.assertFalse(Ingredient.objects.exists())
+
+    def test_csv_with_wrong_columns(self):
+        with self.assertRaises(CommandError):
+            self.run_import('мука,г,лишнее\n', '.csv')
+
+
+class IngredientAutocompleteTest(BaseAPITestCase):
+    url = reverse('api:ingredients-list')
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('рисовая мука', 'мука ржаная', 'Мука', 'молоко',
+                     'мускатный орех'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'name': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix_then_contains_then_typo(self):
+        self.assertEqual(self.search('мука'), [
+            'Мука', 'мука ржаная', 'рисовая мука', 'мускатный орех'
+        ])
+        self.assertEqual(self.search('орех'), ['мускатный орех'])
+
+    def test_typo(self):
+        self.assertEqual(self.search('мкуа'), ['Мука', 'мука ржаная'])
+        self.assertEqual(self.search('мускатнй'), ['мускатный орех'])
+        # Короткие запросы без опечаток, иначе подходит почти всё.
+        self.assertEqual(self.search('мкк'), [])
+
+    def test_limit(self):
+        self.assertEqual(
+            self.search('м', limit=2), ['молоко', 'Мука']
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            create_ingredients(INGREDIENT_SEARCH_MAX_LIMIT + 10)
+        self.assertEqual(len(self.search('инг')), INGREDIENT_SEARCH_LIMIT)
+        self.assertEqual(
+            len(self.search('инг', limit=1000)), INGREDIENT_SEARCH_MAX_LIMIT
+        )
+
+    def test_typo_variants_do_not_depend_on_alphabet(self):
+        path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+        with open(path, encoding='utf-8') as file:
+            items = [{'name': name} for name, _ in csv.reader(file)]
+        index = AutocompleteIndex(items)
+        wider = AutocompleteIndex(items + [
+            {'name': chr(code) * 5} for code in range(ord('a'), ord('z'))
+        ])
+        self.assertGreater(len(wider.alphabet), len(index.alphabet))
+        for query in ('мкуа', 'сахраный', 'картофле', 'говядина тушеная'):
+            with self.subTest(query):
+                variants = index._typo_variants(query)
+                self.assertLessEqual(len(variants), 5)
+                self.assertLessEqual(variants, index.prefixes)
+                self.assertEqual(wider._typo_variants(query), variants)
+
+
+class MergeIngredientsTest(BaseAPITestCase):
+    """Слияние дублей перед ограничением уникальности в миграции 0008."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.keep, cls.duplicate = create_ingredients(2)
+        author = create_user('author')
+        cls.both, = create_recipes(
+            author, 1, ingredients=[cls.keep, cls.duplicate], amount=10
+        )
+        cls.only_duplicate, = create_recipes(
+            author, 1, ingredients=[cls.duplicate], amount=7
+        )
+
+    def test_rows_are_repointed_and_summed(self):
+        self.client.force_authenticate(self.user)
+        for recipe in (self.both, self.only_duplicate):
+            self.client.post(
+                reverse('api:recipes-shopping-cart', args=[recipe.pk])
+            )
+        merge_ingredients(self.keep.pk, [self.duplicate.pk])
+        self.assertFalse(
+            Ingredient.objects.filter(pk=self.duplicate.pk).exists()
+        )
+        self.assertEqual(
+            dict(IngredientAmount.objects.values_list(
+                'recipe_id', 'amount'
+            ).filter(ingredients=self.keep)),
+            {self.both.pk: 20, self.only_duplicate.pk: 7}
+        )
+        self.assertEqual(
+            get_stored_cart_totals([self.user.pk]),
+            get_live_cart_totals([self.user.pk])
+        )
+        self.assertEqual(
+            CartIngredient.objects.get(user=self.user).amount, 27
+        )
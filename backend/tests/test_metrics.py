@@ -0,0 +1,22 @@
+from django.test import TestCase, override_settings
+
+
+class MetricsViewTest(TestCase):
+    url = '/metrics'
+
+    @override_settings(METRICS_TOKEN='')
+    def test_hidden_without_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        response = self.client.get(
+            self.url, HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            self.url, HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE', response.content)
@@ -0,0 +1,90 @@
+import io
+
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from recipes.models import Favorite, Recipe
+from .base import BaseAPITestCase, create_recipes, create_user
+
+
+class PopularityCountersTest(BaseAPITestCase):
+    """Счётчики избранного и списков покупок и сортировка по ним."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(f'user{number}') for number in range(2)]
+        cls.recipes = create_recipes(create_user('author'), 3)
+
+    def get_counters(self, recipe):
+        response = self.client.get(
+            reverse('api:recipes-counters'), {'ids': recipe.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        counters, = response.data
+        return counters['favorites_count'], counters['in_carts_count']
+
+    def send(self, user, method, name, recipe, status):
+        self.client.force_authenticate(user)
+        response = getattr(self.client, method)(
+            reverse(f'api:recipes-{name}', args=[recipe.pk])
+        )
+        self.assertEqual(response.status_code, status)
+
+    def test_counters_follow_favorites_and_carts(self):
+        recipe = self.recipes[0]
+        for user in self.users:
+            self.send(user, 'post', 'favorite', recipe, 201)
+        self.send(self.users[0], 'post', 'shopping-cart', recipe, 201)
+        self.assertEqual(self.get_counters(recipe), (2, 1))
+        # Повторное добавление не считается дважды.
+        self.send(self.users[0], 'post', 'favorite', recipe, 400)
+        self.assertEqual(self.get_counters(recipe), (2, 1))
+        self.send(self.users[1], 'delete', 'favorite', recipe, 204)
+        self.send(self.users[0], 'delete', 'shopping-cart', recipe, 204)
+        self.assertEqual(self.get_counters(recipe), (1, 0))
+
+    def test_batch_changes_counters(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post(
+            reverse('api:recipes-shopping-cart-batch'),
+            {'add': [recipe.pk for recipe in self.recipes]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_counters(self.recipes[1]), (0, 1))
+        response = self.client.post(
+            reverse('api:recipes-shopping-cart-batch'),
+            {'remove': [self.recipes[1].pk]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_counters(self.recipes[1]), (0, 0))
+
+    def test_popular_ordering(self):
+        first, second, third = self.recipes
+        for user in self.users:
+            self.send(user, 'post', 'favorite', second, 201)
+        self.send(self.users[0], 'post', 'favorite', third, 201)
+        response = self.client.get(
+            reverse('api:recipes-list'), {'ordering': 'popular'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [second.pk, third.pk, first.pk]
+        )
+
+    def test_command_fixes_drifted_counters(self):
+        recipe = self.recipes[0]
+        Favorite.objects.create(user=self.users[0], recipe=recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=5, in_carts_count=2
+        )
+        with self.assertRaisesMessage(CommandError, str(recipe.pk)):
+            call_command(
+                'popularity_counters', '--verify', stdout=io.StringIO()
+            )
+        self.assertEqual(self.get_counters(recipe), (5, 2))
+        call_command('popularity_counters', stdout=io.StringIO())
+        self.assertEqual(self.get_counters(recipe), (1, 0))
+        call_command(
+            'popularity_counters', '--verify', stdout=io.StringIO()
+        )
@@ -0,0 +1,195 @@
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes.matching import match_index
+from recipes.models import Cart, Favorite
+from recipes.search import python_backend
+from users.models import Follow
+from .base import (
+    GIF, BaseAPITransactionTestCase, create_ingredients, create_recipes,
+    create_tags, create_user
+)
+
+INGREDIENTS = 150
+
+
+class QueryBudgetTest(BaseAPITransactionTestCase):
+    """Эндпоинты укладываются в ``QUERY_BUDGETS``.
+
+    Запросы идут с настоящими коммитами, как в работе. Считаются и
+    колбэки после коммита, и чтение потокового ответа. Картинка, как
+    и в работе, обрабатывается вне запроса, и её запросы проверяются
+    по отдельному бюджету. Рецепты большие, со 150 ингредиентами,
+    а создаются и обычные, с одним ингредиентом и тегом.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('reader')
+        self.author = create_user('author')
+        self.tags = create_tags(2)
+        self.ingredients = create_ingredients(INGREDIENTS)
+        self.recipes = create_recipes(
+            self.author, 8, tags=self.tags, ingredients=self.ingredients
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        for model in (Favorite, Cart):
+            model.objects.bulk_create(
+                model(user=self.user, recipe=recipe)
+                for recipe in self.recipes[:4]
+            )
+        self.client.force_authenticate(self.user)
+        # Индексы в памяти в работе уже построены и при записи
+        # обновляются по отдельным рецептам.
+        python_backend.find('рецепт')
+        match_index.rank([])
+
+    def assert_queries(self, endpoint, queries):
+        budget = settings.QUERY_BUDGETS[endpoint]
+        self.assertLessEqual(
+            queries, budget, f'{endpoint}: {queries} при бюджете {budget}'
+        )
+
+    def assert_within_budget(self, endpoint, method, url, data=None,
+                             status=200, **kwargs):
+        with override_settings(RECIPE_IMAGE_ASYNC=True), mock.patch(
+            'recipes.images.get_executor'
+        ) as get_executor:
+            response, queries = self.count_queries(
+                method, url, data, **kwargs
+            )
+        self.assertEqual(response.status_code, status, endpoint)
+        self.assert_queries(endpoint, queries)
+        for call in get_executor.return_value.submit.call_args_list:
+            _, func, *args = call.args
+            with CaptureQueriesContext(connection) as context:
+                func(*args)
+            self.assert_queries('process_recipe_image', len(context))
+        return response
+
+    def get_recipe_body(self, ingredients, tags=None):
+        return {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': [tag.pk for tag in tags or self.tags], 'image': GIF,
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 5}
+                for ingredient in ingredients
+            ],
+        }
+
+    def test_recipe_reads(self):
+        recipe = self.recipes[0].pk
+        for endpoint, url in (
+            ('RecipeViewSet.list', reverse('api:recipes-list')),
+            ('RecipeViewSet.retrieve',
+             reverse('api:recipes-detail', args=[recipe])),
+            ('RecipeViewSet.feed', reverse('api:recipes-feed')),
+            ('RecipeViewSet.counters',
+             f'{reverse("api:recipes-counters")}?ids={recipe}'),
+        ):
+            with self.subTest(endpoint):
+                self.assert_within_budget(endpoint, 'get', url)
+
+    def test_filtered_recipe_list(self):
+        self.assert_within_budget(
+            'RecipeViewSet.list', 'get', reverse('api:recipes-list'), {
+                'is_favorited': 1, 'is_in_shopping_cart': 1,
+                'tags': [self.tags[0].slug], 'author': self.author.pk,
+                'have': [self.ingredients[0].pk], 'search': 'рецепт',
+            }
+        )
+
+    def test_download_shopping_cart(self):
+        url = reverse('api:recipes-download-shopping-cart')
+        for fmt in ('txt', 'csv', 'pdf'):
+            with self.subTest(fmt):
+                self.assert_within_budget(
+                    'RecipeViewSet.download_shopping_cart', 'get',
+                    f'{url}?format={fmt}'
+                )
+
+    def test_create(self):
+        self.client.force_authenticate(self.author)
+        for body in (
+            self.get_recipe_body(self.ingredients[:1], self.tags[:1]),
+            self.get_recipe_body(self.ingredients),
+        ):
+            with self.subTest(ingredients=len(body['ingredients'])):
+                self.assert_within_budget(
+                    'RecipeViewSet.create', 'post',
+                    reverse('api:recipes-list'), body, format='json',
+                    status=201
+                )
+
+    def test_update(self):
+        self.client.force_authenticate(self.author)
+        url = reverse('api:recipes-detail', args=[self.recipes[0].pk])
+        body = self.get_recipe_body(self.ingredients[50:])
+        self.assert_within_budget(
+            'RecipeViewSet.update', 'put', url, body, format='json'
+        )
+        body = self.get_recipe_body(self.ingredients[:100])
+        self.assert_within_budget(
+            'RecipeViewSet.partial_update', 'patch', url, body,
+            format='json'
+        )
+
+    def test_destroy(self):
+        self.client.force_authenticate(self.author)
+        self.assert_within_budget(
+            'RecipeViewSet.destroy', 'delete',
+            reverse('api:recipes-detail', args=[self.recipes[0].pk]),
+            status=204
+        )
+
+    def test_favorite_and_cart(self):
+        recipe = self.recipes[-1].pk
+        for name, endpoint in (('favorite', 'favorite'),
+                               ('shopping-cart', 'shopping_cart')):
+            url = reverse(f'api:recipes-{name}', args=[recipe])
+            with self.subTest(endpoint):
+                self.assert_within_budget(
+                    f'RecipeViewSet.{endpoint}', 'post', url, status=201
+                )
+                self.assert_within_budget(
+                    f'RecipeViewSet.del_from_{endpoint}', 'delete', url,
+                    status=204
+                )
+                self.assert_within_budget(
+                    f'RecipeViewSet.{endpoint}_batch', 'post',
+                    reverse(f'api:recipes-{name}-batch'), {
+                        'add': [recipe.pk for recipe in self.recipes[4:]],
+                        'remove': [recipe.pk for recipe in self.recipes[:4]],
+                    }, format='json'
+                )
+
+    def test_users(self):
+        other = create_user('other')
+        for endpoint, method, url, status in (
+            ('FollowViewSet.list', 'get', reverse('api:users-list'), 200),
+            ('FollowViewSet.retrieve', 'get',
+             reverse('api:users-detail', args=[self.author.pk]), 200),
+            ('FollowViewSet.me', 'get', reverse('api:users-me'), 200),
+            ('FollowViewSet.subscriptions', 'get',
+             f'{reverse("api:users-subscriptions")}?recipes_limit=3', 200),
+            ('FollowViewSet.subscribe', 'post',
+             reverse('api:users-subscribe', args=[other.pk]), 201),
+            ('FollowViewSet.unsubscribe', 'delete',
+             reverse('api:users-subscribe', args=[other.pk]), 204),
+        ):
+            with self.subTest(endpoint):
+                self.assert_within_budget(endpoint, method, url, status=status)
+
+    def test_references(self):
+        for endpoint, url in (
+            ('TagsViewSet.list', reverse('api:tags-list')),
+            ('IngredientsViewSet.list',
+             f'{reverse("api:ingredients-list")}?name=инг'),
+        ):
+            with self.subTest(endpoint):
+                self.assert_within_budget(endpoint, 'get', url)
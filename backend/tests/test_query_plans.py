@@ -0,0 +1,117 @@
+import re
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.views import RecipeViewSet
+from recipes.models import Cart, Favorite, Recipe, User
+from .base import create_ingredients
+
+RecipeTag = Recipe.tags.through
+
+
+class RecipeQueryPlanTest(TestCase):
+    """Фильтры списка рецептов используют индексы на большом наборе данных.
+
+    На PostgreSQL последовательное чтение запрещается, поэтому тест
+    падает, только если подходящего индекса нет вовсе.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_ingredients(50)
+        call_command(
+            'generate_data', users=200, authors=20, recipes=2000,
+            ingredients_per_recipe=3, favorites=30, cart=10,
+            stdout=StringIO()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = User.objects.filter(
+            username__startswith='bench_'
+        ).order_by('pk').first()
+
+    def get_queryset(self, **params):
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = self.user
+        view = RecipeViewSet(request=request, action='list', format_kwarg=None)
+        return view.filter_queryset(view.get_queryset())
+
+    def explain(self, queryset):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        try:
+            return queryset.explain()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+
+    @staticmethod
+    def get_index_names(model):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Индексы ограничений уникальности SQLite называет сам.
+                cursor.execute(f'PRAGMA index_list({table})')
+                return {row[1] for row in cursor.fetchall()}
+            return set(
+                connection.introspection.get_constraints(cursor, table)
+            )
+
+    def assert_uses_index(self, queryset, model, index=None):
+        """В плане нет полных просмотров, а ``model`` читается по индексу.
+
+        Если ``index`` задан, должен использоваться именно он.
+        """
+        plan = self.explain(queryset)
+        if connection.vendor == 'postgresql':
+            full_scan = r'Seq Scan'
+            index_scan = r'Index (?:Only )?Scan (?:Backward )?using (\w+)'
+        else:
+            full_scan = r'\bSCAN \w+$'
+            index_scan = r'USING (?:COVERING )?INDEX (\w+)'
+        self.assertNotRegex(plan, re.compile(full_scan, re.MULTILINE))
+        used = set(re.findall(index_scan, plan))
+        expected = {index} if index else self.get_index_names(model)
+        self.assertTrue(used & expected, plan)
+
+    def test_default_ordering(self):
+        self.assert_uses_index(
+            self.get_queryset(), Recipe,
+            'recipe_pub_date_id_idx'
+        )
+
+    def test_author(self):
+        author_id = Recipe.objects.values_list('author_id', flat=True)[0]
+        self.assert_uses_index(
+            self.get_queryset(author=author_id), Recipe,
+            'recipe_author_pub_date_idx'
+        )
+
+    def test_popular(self):
+        self.assert_uses_index(
+            self.get_queryset(ordering='popular'), Recipe,
+            'recipe_popular_idx'
+        )
+
+    def test_tags(self):
+        self.assert_uses_index(
+            self.get_queryset(tags=['breakfast', 'lunch']),
+            RecipeTag
+        )
+
+    def test_is_favorited(self):
+        self.assert_uses_index(
+            self.get_queryset(is_favorited=1), Favorite
+        )
+
+    def test_is_in_shopping_cart(self):
+        self.assert_uses_index(
+            self.get_queryset(is_in_shopping_cart=1), Cart
+        )
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.urls import reverse
+
+from api.changes import RecipeChanges
+from recipes.models import IngredientAmount, Recipe, RecipeDocument
+from .base import (
+    BaseAPITestCase, create_ingredients, create_recipes, create_tags,
+    create_user
+)
+
+
+class RecipeChangesTest(BaseAPITestCase):
+    """Сигналы строк рецепта дают один колбэк на транзакцию."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.tags = create_tags(1)
+        cls.ingredients = create_ingredients(150)
+        cls.recipe, cls.other = create_recipes(
+            cls.user, 2, tags=cls.tags, ingredients=cls.ingredients
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def get_changes(callbacks):
+        return [
+            callback for callback in callbacks
+            if isinstance(callback, RecipeChanges)
+        ]
+
+    def test_cascade_delete_schedules_one_removal(self):
+        url = reverse('api:recipes-detail', args=[self.recipe.pk])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertLess(len(callbacks), 10)
+        changes, = self.get_changes(callbacks)
+        self.assertEqual(changes.removed, {self.recipe.pk})
+        self.assertEqual(changes.updated - changes.removed, set())
+        self.assertFalse(
+            RecipeDocument.objects.filter(recipe=self.recipe.pk).exists()
+        )
+
+    def test_update_schedules_one_refresh(self):
+        url = reverse('api:recipes-detail', args=[self.recipe.pk])
+        data = {
+            'name': 'Новое имя', 'text': 'Описание', 'cooking_time': 5,
+            'tags': [self.tags[0].pk], 'ingredients': [
+                {'id': ingredient.pk, 'amount': 20}
+                for ingredient in self.ingredients[:3]
+            ],
+        }
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.patch(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        changes, = self.get_changes(callbacks)
+        self.assertEqual(changes.updated, {self.recipe.pk})
+        document = RecipeDocument.objects.get(recipe=self.recipe.pk)
+        self.assertEqual(document.data['name'], 'Новое имя')
+        self.assertEqual(len(document.data['ingredients']), 3)
+
+    def test_rolled_back_changes_are_dropped(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    IngredientAmount.objects.filter(
+                        recipe=self.recipe
+                    ).first().save()
+                    raise ValueError
+            IngredientAmount.objects.filter(recipe=self.other).first().save()
+        changes, = self.get_changes(callbacks)
+        self.assertEqual(changes.updated, {self.other.pk})
+        self.assertTrue(Recipe.objects.filter(pk=self.recipe.pk).exists())
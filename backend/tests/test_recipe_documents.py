@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.documents import fill_missing_documents, update_documents
+from api.serializers import RecipeReadSerializer
+from api.views import RecipeViewSet
+from recipes.models import Cart, Favorite, Recipe, RecipeDocument
+from users.models import Follow
+from .base import (
+    BaseAPITestCase, create_ingredients, create_recipes, create_tags,
+    create_user
+)
+
+
+class RecipeDocumentTest(BaseAPITestCase):
+    """Ответы из документов совпадают с ``RecipeReadSerializer``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.recipes = create_recipes(
+            cls.author, 3, tags=create_tags(2),
+            ingredients=create_ingredients(5)
+        )
+        size = next(iter(settings.RECIPE_IMAGE_SIZES))
+        Recipe.objects.filter(pk=cls.recipes[0].pk).update(
+            image='recipe_images/aa/bb/original.webp',
+            thumbnails={size: f'recipe_images/aa/bb/{size}.webp'}
+        )
+        update_documents([cls.recipes[0].pk])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        Cart.objects.create(user=cls.user, recipe=cls.recipes[1])
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def get_expected(self, response, user, pks):
+        """Рецепты в формате ``RecipeReadSerializer`` для ``user``."""
+        request = Request(APIRequestFactory().put('/api/recipes/'))
+        request.user = user
+        view = RecipeViewSet(request=request, action='update',
+                             format_kwarg=None)
+        recipes = view.get_queryset().in_bulk(pks)
+        return [
+            RecipeReadSerializer(
+                recipes[pk], context={'request': response.wsgi_request}
+            ).data
+            for pk in pks
+        ]
+
+    def assert_matches_read_serializer(self, user=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        request_user = user or AnonymousUser()
+        response = self.client.get(reverse('api:recipes-list'))
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), len(self.recipes))
+        self.assertEqual(results, self.get_expected(
+            response, request_user, [recipe['id'] for recipe in results]
+        ))
+        for recipe in self.recipes:
+            response = self.client.get(
+                reverse('api:recipes-detail', args=[recipe.pk])
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [response.data],
+                self.get_expected(response, request_user, [recipe.pk])
+            )
+
+    def test_anonymous_matches_read_serializer(self):
+        self.assert_matches_read_serializer()
+
+    def test_authenticated_matches_read_serializer(self):
+        self.assert_matches_read_serializer(self.user)
+
+    def test_missing_document_does_not_replace_newer(self):
+        recipe = self.recipes[2]
+        stale = Recipe.objects.get(pk=recipe.pk)
+        stale.document_data = None
+        Recipe.objects.filter(pk=recipe.pk).update(name='Новое имя')
+        update_documents([recipe.pk])
+        old = {**RecipeDocument.objects.get(recipe=recipe).data,
+               'name': 'Старое имя'}
+        with mock.patch(
+            'api.documents.build_documents', return_value={recipe.pk: old}
+        ):
+            fill_missing_documents([stale])
+        self.assertEqual(
+            RecipeDocument.objects.get(recipe=recipe).data['name'],
+            'Новое имя'
+        )
@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.urls import reverse
+
+from recipes.indexes import MAX_PENDING_CHANGES
+from recipes.matching import IngredientMatchIndex
+from recipes.models import Favorite, IndexChange, Recipe
+from recipes.search import PythonSearchBackend
+from .base import (
+    BaseAPITestCase, create_ingredients, create_recipes, create_user
+)
+
+
+class LocalRecipeIndexTest(BaseAPITestCase):
+    """Два экземпляра индекса изображают два процесса с общей базой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.recipes = create_recipes(cls.user, 3)
+
+    def setUp(self):
+        super().setUp()
+        self.writer = PythonSearchBackend()
+        self.reader = PythonSearchBackend()
+        for index in (self.writer, self.reader):
+            index.find('рецепт')
+
+    def rename(self, recipe, name):
+        Recipe.objects.filter(pk=recipe.pk).update(name=name)
+        self.writer.update([recipe.pk])
+
+    def test_reader_applies_changes_without_rebuild(self):
+        self.rename(self.recipes[0], 'Борщ')
+        self.rename(self.recipes[1], 'Щи')
+        with mock.patch.object(
+            self.reader, 'rebuild', side_effect=AssertionError
+        ):
+            self.assertEqual(list(self.reader.find('борщ')),
+                             [self.recipes[0].pk])
+            self.assertEqual(list(self.reader.find('щи')),
+                             [self.recipes[1].pk])
+
+    def test_versions_do_not_collide(self):
+        first = self.writer.publish([self.recipes[0].pk])
+        second = self.reader.publish([self.recipes[1].pk])
+        self.assertEqual(second, first + 1)
+
+    def test_reader_rebuilds_without_change_log(self):
+        self.rename(self.recipes[0], 'Борщ')
+        IndexChange.objects.filter(
+            index=self.writer.version_key, version=self.writer.get_version()
+        ).delete()
+        with mock.patch.object(
+            self.reader, 'rebuild', wraps=self.reader.rebuild
+        ) as rebuild:
+            self.assertEqual(list(self.reader.find('борщ')),
+                             [self.recipes[0].pk])
+        rebuild.assert_called_once_with()
+
+    def test_reset_rebuilds_every_process(self):
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(name='Борщ')
+        self.writer.reset()
+        self.assertEqual(list(self.reader.find('борщ')),
+                         [self.recipes[0].pk])
+
+    def test_indexes_count_versions_separately(self):
+        index = IngredientMatchIndex()
+        start = index.get_version()
+        versions = [index.publish([recipe.pk]) for recipe in self.recipes]
+        self.assertEqual(versions, [start + 1, start + 2, start + 3])
+        self.assertEqual(IngredientMatchIndex().get_version(), start + 3)
+
+    def test_old_changes_are_pruned(self):
+        with mock.patch('recipes.indexes.CHANGES_CLEANUP_INTERVAL', 1):
+            for _ in range(MAX_PENDING_CHANGES + 5):
+                self.writer.publish([self.recipes[0].pk])
+        self.assertEqual(
+            IndexChange.objects.filter(index=self.writer.version_key).count(),
+            MAX_PENDING_CHANGES
+        )
+
+
+class HaveFilterTest(BaseAPITestCase):
+    url = reverse('api:recipes-list')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.ingredient, = create_ingredients(1)
+        cls.recipes = create_recipes(
+            create_user('author'), 5, ingredients=[cls.ingredient]
+        )
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+
+    def test_filtered_match_is_not_crowded_out(self):
+        # Лучшие по рангу рецепты не в избранном и не должны вытеснить
+        # подходящий рецепт из ограниченной выдачи.
+        self.client.force_authenticate(self.user)
+        with mock.patch('recipes.matching.MATCH_RESULTS_LIMIT', 2):
+            response = self.client.get(self.url, {
+                'have': self.ingredient.pk, 'is_favorited': 1
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipes[0].pk]
+        )
@@ -0,0 +1,65 @@
+from django.urls import reverse
+
+from .base import (
+    BaseAPITestCase, create_ingredients, create_recipes, create_tags,
+    create_user
+)
+
+PAGE_SIZES = (1, 6, 50)
+
+
+class RecipeReadQueriesTest(BaseAPITestCase):
+    """Число SQL-запросов страницы рецептов не зависит от её размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.viewer = create_user('viewer')
+        cls.recipes = create_recipes(
+            cls.author, 60, tags=create_tags(3),
+            ingredients=create_ingredients(5)
+        )
+
+    def get_counts(self, url):
+        counts = []
+        for limit in PAGE_SIZES:
+            response, queries = self.count_queries(
+                'get', url, {'limit': limit}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+            counts.append(queries)
+        return counts
+
+    def assert_flat(self, counts):
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_list_anonymous(self):
+        self.assert_flat(self.get_counts(reverse('api:recipes-list')))
+
+    def test_list_authenticated(self):
+        self.client.force_authenticate(self.viewer)
+        self.assert_flat(self.get_counts(reverse('api:recipes-list')))
+
+    def test_list_cursor(self):
+        self.client.force_authenticate(self.viewer)
+        self.assert_flat(
+            self.get_counts(reverse('api:recipes-list') + '?cursor=')
+        )
+
+    def test_feed(self):
+        self.client.force_authenticate(self.viewer)
+        self.client.post(reverse('api:users-subscribe', args=[self.author.pk]))
+        self.assert_flat(self.get_counts(reverse('api:recipes-feed')))
+
+    def test_detail(self):
+        self.client.force_authenticate(self.viewer)
+        counts = []
+        for recipe in self.recipes[:3]:
+            response, queries = self.count_queries(
+                'get', reverse('api:recipes-detail', args=[recipe.pk])
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['ingredients']), 5)
+            counts.append(queries)
+        self.assert_flat(counts)
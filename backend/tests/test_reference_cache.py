@@ -0,0 +1,117 @@
+from django.urls import reverse
+from django.utils.http import http_date
+
+from api.cache import recipe_response_cache
+from api.documents import update_documents
+from recipes.models import Recipe, Tag, Version
+from recipes.versions import bump_versions, get_version, get_versions
+from .base import BaseAPITestCase, create_recipes, create_tags, create_user
+
+
+class ReferenceRevalidationTest(BaseAPITestCase):
+    """Справочники отвечают 304, пока версия не изменилась."""
+    url = reverse('api:tags-list')
+
+    @classmethod
+    def setUpTestData(cls):
+        create_tags(2)
+
+    def setUp(self):
+        super().setUp()
+        # Версия появляется после первого изменения справочника.
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Тег', color='#ABCDEF', slug='tag')
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(slug='tag').delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), 2)
+
+    def test_last_modified_revalidation(self):
+        response = self.client.get(self.url)
+        last_modified = response['Last-Modified']
+        _, updated = get_version('reference:tags:version')
+        self.assertEqual(last_modified, http_date(updated.timestamp()))
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=http_date(0)
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class RecipeResponseCacheTest(BaseAPITestCase):
+    """Анонимные ответы с рецептами берутся из кэша до их изменения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.recipe, = create_recipes(cls.author, 1)
+        Recipe.objects.filter(pk=cls.recipe.pk).update(
+            image='recipe_images/aa/bb/original.webp'
+        )
+        update_documents([cls.recipe.pk])
+        cls.url = reverse('api:recipes-detail', args=[cls.recipe.pk])
+
+    def get(self, url, **kwargs):
+        response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hits_and_misses_are_counted(self):
+        list_url = reverse('api:recipes-list')
+        self.assertEqual(self.get(list_url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(list_url)['X-Cache'], 'HIT')
+        self.assertEqual(self.get(f'{list_url}?page=1')['X-Cache'], 'HIT')
+        self.assertEqual(recipe_response_cache.stats(), {
+            'hits': 2, 'misses': 1, 'hit_ratio': 0.6667,
+        })
+
+    def test_scheme_is_part_of_key(self):
+        response = self.get(self.url)
+        self.assertTrue(response.data['image'].startswith('http://'))
+        response = self.get(self.url, secure=True)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.data['image'].startswith('https://'))
+        self.assertEqual(self.get(self.url, secure=True)['X-Cache'], 'HIT')
+
+    def test_edit_invalidates_recipe(self):
+        self.get(self.url)
+        self.assertEqual(self.get(self.url)['X-Cache'], 'HIT')
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                self.url, {'name': 'Новое имя'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(None)
+        response = self.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['name'], 'Новое имя')
+        self.assertEqual(self.get(self.url)['X-Cache'], 'HIT')
+
+
+class VersionsTest(BaseAPITestCase):
+
+    def test_missing_versions_are_zero_and_not_stored(self):
+        self.assertEqual(get_versions(['a', 'b']), {'a': 0, 'b': 0})
+        self.assertEqual(get_version('a'), (0, None))
+        self.assertFalse(Version.objects.exists())
+
+    def test_bump_increments(self):
+        self.assertEqual(bump_versions(['a', 'b']), {'a': 1, 'b': 1})
+        self.assertEqual(bump_versions(['b', 'b']), {'b': 2})
+        self.assertEqual(get_versions(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2, 'c': 0})
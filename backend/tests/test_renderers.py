@@ -0,0 +1,43 @@
+import datetime
+import json
+from decimal import Decimal
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer, orjson
+
+
+@skipIf(orjson is None, 'orjson не установлен')
+class FastJSONRendererTest(SimpleTestCase):
+    """orjson отдаёт те же значения, что и ``JSONRenderer``."""
+
+    def render(self, data):
+        return (FastJSONRenderer().render(data),
+                JSONRenderer().render(data))
+
+    def test_same_bytes_without_floats(self):
+        data = {
+            'name': 'Борщ\u2028', 'amount': 5, 'ok': True, 'none': None,
+            'date': datetime.datetime(
+                2024, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc
+            ),
+            'day': datetime.date(2024, 1, 2),
+            'price': Decimal('1.50'), 'items': [1, '2'], 1: 'ключ',
+        }
+        fast, standard = self.render(data)
+        self.assertEqual(fast, standard)
+
+    def test_floats_differ_only_in_notation(self):
+        data = {'small': 0.1, 'large': 1e20, 'negative': -2.5e-7}
+        fast, standard = self.render(data)
+        self.assertEqual(json.loads(fast), json.loads(standard))
+        self.assertIn(b'1e20', fast)
+        self.assertIn(b'1e+20', standard)
+
+    def test_nan_becomes_null(self):
+        self.assertEqual(FastJSONRenderer().render({'value': float('nan')}),
+                         b'{"value":null}')
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({'value': float('nan')})
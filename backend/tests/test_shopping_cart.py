@@ -0,0 +1,94 @@
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from recipes.models import Ingredient
+from recipes.units import humanize_amount
+from .base import (
+    BaseAPITestCase, create_ingredients, create_recipes, create_user
+)
+
+FORMATS = ('txt', 'csv', 'pdf')
+EXPECTED_LINES = {
+    'txt': 'ингредиент 0 - 10г\n',
+    'csv': 'ингредиент 0,10,г\r\n',
+}
+
+
+class DownloadShoppingCartTest(BaseAPITestCase):
+    url = reverse('api:recipes-download-shopping-cart')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.recipe, = create_recipes(
+            create_user('author'), 1, ingredients=create_ingredients(2)
+        )
+
+    def test_formats(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(
+            reverse('api:recipes-shopping-cart', args=[self.recipe.pk])
+        )
+        for format in FORMATS:
+            with self.subTest(format=format):
+                response = self.client.get(self.url, {'format': format})
+                self.assertEqual(response.status_code, 200)
+                content = b''.join(response.streaming_content)
+                if format == 'pdf':
+                    self.assertTrue(content.startswith(b'%PDF'))
+                else:
+                    self.assertIn(EXPECTED_LINES[format], content.decode())
+
+    def test_errors_are_rendered_in_every_format(self):
+        for format in FORMATS:
+            with self.subTest(format=format):
+                response = self.client.get(self.url, {'format': format})
+                self.assertEqual(response.status_code, 401)
+                self.assertIn('Учетные данные', response.content.decode())
+
+
+class ShoppingCartUnitsTest(BaseAPITestCase):
+    url = reverse('api:recipes-download-shopping-cart')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        author = create_user('author')
+        cls.recipes = [
+            *create_recipes(author, 1, ingredients=[
+                Ingredient.objects.create(name='мука', measurement_unit='г')
+            ], amount=500),
+            *create_recipes(author, 1, ingredients=[
+                Ingredient.objects.create(name='мука', measurement_unit='кг'),
+                Ingredient.objects.create(name='соль', measurement_unit='г'),
+            ], amount=2),
+        ]
+
+    def test_grams_and_kilograms_are_merged(self):
+        self.client.force_authenticate(self.user)
+        for recipe in self.recipes:
+            self.client.post(
+                reverse('api:recipes-shopping-cart', args=[recipe.pk])
+            )
+        response = self.client.get(self.url, {'format': 'txt'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertIn('мука - 2.5кг', lines)
+        self.assertIn('соль - 2г', lines)
+        self.assertEqual(len([
+            line for line in lines if line.startswith('мука')
+        ]), 1)
+
+
+class HumanizeAmountTest(SimpleTestCase):
+
+    def test_boundaries(self):
+        for amount, unit, expected in (
+            (999, 'г', (999, 'г')),
+            (1000, 'г', (1, 'кг')),
+            (1500, 'мл', (1.5, 'л')),
+            (1234, 'г', (1.234, 'кг')),
+            (5000, 'шт.', (5000, 'шт.')),
+        ):
+            with self.subTest(amount=amount, unit=unit):
+                self.assertEqual(humanize_amount(amount, unit), expected)
@@ -0,0 +1,120 @@
+import base64
+import io
+import os
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.uploads import remove_expired_uploads
+from .base import (
+    BaseAPITestCase, create_ingredients, create_tags, create_user
+)
+
+# Сигнатура PNG, за которой нет картинки.
+BROKEN_PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def create_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (50, 40), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ImageUploadTest(BaseAPITestCase):
+    upload_url = reverse('api:recipes-upload-image')
+    recipes_url = reverse('api:recipes-list')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        cls.other = create_user('other')
+        cls.body = {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': [create_tags(1)[0].pk],
+            'ingredients': [{'id': create_ingredients(1)[0].pk, 'amount': 5}],
+        }
+
+    def upload(self, content=None, status=201):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(self.upload_url, {
+            'image': SimpleUploadedFile('image.png', content or create_png()),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status)
+        return response.data['image']
+
+    def create_recipe(self, image, user=None):
+        self.client.force_authenticate(user or self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                self.recipes_url, {**self.body, 'image': image},
+                format='json'
+            )
+
+    def test_token_survives_cache_loss(self):
+        token = self.upload()
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        response = self.create_recipe(token)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(Recipe.objects.get().image.name)
+
+    def test_token_is_single_use(self):
+        token = self.upload()
+        self.assertEqual(self.create_recipe(token).status_code, 201)
+        response = self.create_recipe(token)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_foreign_and_tampered_tokens(self):
+        token = self.upload()
+        self.assertEqual(self.create_recipe(token, self.other).status_code,
+                         400)
+        self.assertEqual(self.create_recipe(token + 'x').status_code, 400)
+        self.assertEqual(self.create_recipe(token).status_code, 201)
+
+    def test_expired_uploads_are_removed(self):
+        self.upload()
+        directory = settings.RECIPE_IMAGE_UPLOAD_DIR
+        expired = time.time() - settings.RECIPE_IMAGE_UPLOAD_TTL - 1
+        for name in os.listdir(directory):
+            os.utime(os.path.join(directory, name), (expired, expired))
+        self.assertGreaterEqual(remove_expired_uploads(), 1)
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_failed_save_keeps_token(self):
+        token = self.upload()
+        with mock.patch(
+            'api.serializers.schedule_recipe_image', side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.create_recipe(token)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(self.create_recipe(token).status_code, 201)
+
+    def test_broken_image_is_rejected_before_saving(self):
+        self.upload(BROKEN_PNG, status=400)
+        payload = base64.b64encode(BROKEN_PNG).decode()
+        response = self.create_recipe(f'data:image/png;base64,{payload}')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_image_appears_after_processing(self):
+        # Ответ на создание отдаётся до обработки картинки.
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                self.recipes_url, {**self.body, 'image': self.upload()},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['image'])
+        for callback in callbacks:
+            callback()
+        self.assertTrue(Recipe.objects.get().image.name)